@@ -1,22 +1,64 @@
-import pandas as pd
-import plotly.graph_objects as go
 from dash import Dash, dcc, html, Input, Output, callback, State
+import hmac
+import os
 import textwrap
-from flask_caching import Cache  # Import caching
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from flask import abort, jsonify, request
+from lazy_imports import lazy_import
+
+import data_export
+import datastore
+import http_cache
+import image_export
+import local_cache
+import shared_cache
+import sql_store
+import overview_page
+import pyramid_page
+
+# Imported on first use (see lazy_imports.py)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+sector_race_page = lazy_import('sector_race_page')
 
 # Initialize the Dash app with custom styles
-app = Dash(__name__)
+# (page components are created by the router, so callbacks may refer to components not yet in the layout)
+app = Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
 
-# Add caching to improve performance
-cache = Cache(app.server, config={
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
-})
+# Data and charts are cached to improve performance, in the bounded cache of the instance (memory and
+# cache-directory/, see local_cache.py) and in the cache shared by all instances (see shared_cache.py)
 
 # Cache timeout (in seconds)
 TIMEOUT = 60 * 60  # 1 hour
 
+# Token of the cache admin endpoint (/admin/cache), sent in the X-Admin-Token header; the endpoint is
+# disabled without it
+CACHE_ADMIN_TOKEN = os.environ.get('CACHE_ADMIN_TOKEN')
+
+# Well-being data source in the local data store (its file is set in datastore.py)
+DATA_SOURCE = 'well_being'
+
+# Backend of the chart callbacks: 'pandas' keeps the whole dataset in memory and filters it there,
+# 'sqlite' reads only the rows a callback needs from an indexed SQLite copy (set WELL_BEING_BACKEND=sqlite)
+DATA_BACKEND = os.environ.get('WELL_BEING_BACKEND', 'pandas')
+
+# Line charts with more points than this are drawn with WebGL (go.Scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 200
+
+# Dense series (e.g. monthly or quarterly data) are downsampled on the server to this many points
+MAX_LINE_POINTS = 500
+
+# After a selection, the views a user is likely to open next are computed in the background (see prefetch_views):
+# by this many threads, run at this nice value (lower priority than the requests), with at most this many views
+# waiting
+PREFETCH_WORKERS = 1
+PREFETCH_NICENESS = 10
+PREFETCH_MAX_PENDING = 32
+
 # Define flag data for countries
 country_codes = {
     'Argentina': 'ar',
@@ -125,6 +167,21 @@ app.index_string = '''
                 margin-right: 10px;
                 vertical-align: middle;
             }
+            .nav-links {
+                text-align: center;
+                padding: 10px;
+                border-bottom: 1px solid #ddd;
+            }
+            .export-links a {
+                margin-left: 10px;
+                color: #1f77b4;
+            }
+            .nav-links a {
+                margin: 0 15px;
+                color: #1f77b4;
+                text-decoration: none;
+                font-weight: bold;
+            }
         </style>
     </head>
     <body>
@@ -138,8 +195,8 @@ app.index_string = '''
 </html>
 '''
 
-# Define the app layout
-app.layout = html.Div([
+# Define the layout of the well-being dashboard page
+dashboard_layout = html.Div([
     html.H1("Well-being Dashboard"),
     
     html.Div([
@@ -168,9 +225,34 @@ app.layout = html.Div([
             id='intl-comparison-checkbox',
             options=[{'label': 'Show International Comparison', 'value': 'show'}],
             value=[]  # Empty list means not checked
+        ),
+        # Year of the comparison (shown in comparison mode; the earliest and latest comparable years are shown
+        # until a year is chosen)
+        html.Div([
+            html.Label("Compare a single year:", className="dropdown-label"),
+            dcc.Slider(id='comparison-year', min=0, max=1, step=None, marks={}, value=None)
+        ], id='comparison-year-container', style={'display': 'none'})
+    ], className='checkbox-container'),
+    
+    # Add time-series overlay of other economies
+    html.Div([
+        dcc.Checklist(
+            id='overlay-checkbox',
+            options=[{'label': 'Overlay Time Series of Other Economies', 'value': 'overlay'}],
+            value=[]  # Empty list means not checked
+        ),
+        dcc.Dropdown(
+            id='overlay-select',
+            options=[],  # Will be populated after loading data
+            multi=True,
+            placeholder="Select economies to overlay",
+            optionHeight=40
         )
     ], className='checkbox-container'),
     
+    # Links to download the data of the current view (see export_data)
+    html.Div(id='export-links', className='export-links'),
+    
     # Add notes section
     html.Div([
         html.P([
@@ -186,23 +268,294 @@ app.layout = html.Div([
     html.Div(id="charts-container")
 ], style={'maxWidth': '1200px', 'margin': '0 auto', 'padding': '20px'})
 
-# Cache the data loading function
-@cache.memoize(timeout=TIMEOUT)
+# Define the app layout: navigation links and the content of the current page
+app.layout = html.Div([
+    dcc.Location(id='url'),
+    html.Div([
+        dcc.Link("Well-being Dashboard", href='/'),
+        dcc.Link("Overview", href='/overview'),
+        dcc.Link("Sector Value Added Race", href='/sector-race'),
+        dcc.Link("Population Pyramid", href='/population-pyramid')
+    ], className='nav-links'),
+    html.Div(id='page-content')
+])
+
+# Show the page for the current URL
+@app.callback(
+    Output('page-content', 'children'),
+    [Input('url', 'pathname')]
+)
+def display_page(pathname):
+    if pathname == '/overview':
+        return overview_page.layout()
+    if pathname == '/sector-race':
+        return sector_race_page.layout()
+    if pathname == '/population-pyramid':
+        return pyramid_page.layout()
+    return dashboard_layout
+
+# ETags and cache headers of the pages, the Dash layout, the exports and the assets (see http_cache.py)
+http_cache.register(server, lambda: '-'.join(datastore.source_version(name) for name in datastore.SOURCES))
+
+# Inspect (GET) or flush (DELETE) the cached entries, e.g.
+#   curl -H "X-Admin-Token: $CACHE_ADMIN_TOKEN" "http://localhost:8050/admin/cache?prefix=well-being:charts:"
+@server.route('/admin/cache', methods=['GET', 'DELETE'])
+def cache_admin():
+    if not CACHE_ADMIN_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), CACHE_ADMIN_TOKEN):
+        abort(403)
+    
+    # Only the keys starting with the prefix (all keys by default)
+    prefix = request.args.get('prefix', '')
+    if request.method == 'DELETE':
+        return jsonify(flushed=local_cache.flush(prefix))
+    return jsonify(stats={**local_cache.cache_stats(), **shared_cache.stats}, entries=local_cache.entries(prefix))
+
+# Download the rows behind a view of the dashboard, streamed as they are read, e.g.
+#   /export?economy=Hong Kong&domain=Health&format=csv    (the charts of an economy and domain)
+#   /export?domain=Health&view=comparison&format=parquet  (the international comparison of a domain)
+# Without an economy (or domain), the rows of all economies (or domains) are exported.
+# Formats: csv, ndjson and parquet
+@server.route('/export')
+def export_data():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in data_export.FORMATS:
+        abort(400)
+    economy = request.args.get('economy')
+    domain = request.args.get('domain')
+    
+    # The comparison shows the totals and the sex breakdown of all economies (see update_charts)
+    if request.args.get('view') == 'comparison':
+        conditions = {'AGE': '_T', 'EDUCATION_LEV': '_T'}
+        economy = None
+    else:
+        conditions = {'Reference area': economy} if economy else {}
+    if domain:
+        conditions['Domain'] = domain
+    
+    name = '_'.join(part for part in ['well-being', economy or 'all-economies', domain or 'all-domains',
+                                      request.args.get('view')] if part)
+    filename = ''.join(c if c.isalnum() or c in '-_' else '-' for c in name)
+    filename += '.' + data_export.FORMATS[fmt]['extension']
+    return server.response_class(data_export.stream_rows(DATA_SOURCE, conditions, fmt),
+                                 mimetype=data_export.FORMATS[fmt]['mimetype'],
+                                 headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+# Download the charts of a view of the dashboard as images, e.g.
+#   /export/images?economy=Hong Kong&domain=Health&chart=1&format=png  (the first chart, as a PNG image)
+#   /export/images?economy=Hong Kong&domain=Health&view=comparison&format=svg  (all charts, in a zip file)
+# Optional: year (of the comparison), width and height (in pixels) and scale
+@server.route('/export/images')
+def export_images():
+    fmt = request.args.get('format', 'png')
+    economy = request.args.get('economy')
+    domain = request.args.get('domain')
+    width = request.args.get('width', type=int)
+    height = request.args.get('height', type=int)
+    scale = request.args.get('scale', 1, type=float)
+    if (fmt not in image_export.IMAGE_FORMATS or not economy or not domain
+            or any(size is not None and not 0 < size <= image_export.MAX_IMAGE_SIZE for size in (width, height))
+            or not 0 < scale <= image_export.MAX_SCALE):
+        abort(400)
+    
+    # The charts of the view, as shown on the dashboard
+    comparison = ['show'] if request.args.get('view') == 'comparison' else []
+    charts = cached_charts(economy, domain, comparison, comparison_year=request.args.get('year', type=int))
+    figures = image_export.chart_figures(charts)
+    version = datastore.source_version(DATA_SOURCE)
+    
+    chart = request.args.get('chart', type=int)
+    if chart is not None:
+        if not 1 <= chart <= len(figures):
+            abort(404)
+        image = image_export.render_image(figures[chart - 1], fmt, width, height, scale, version)
+        return server.response_class(image, mimetype=image_export.IMAGE_FORMATS[fmt])
+    
+    if not figures:
+        abort(404)
+    images = image_export.render_images(figures, fmt, width, height, scale, version)
+    name = ''.join(c if c.isalnum() else '-' for c in f"{economy}_{domain}_{request.args.get('view', 'charts')}")
+    return server.response_class(image_export.images_zip(figures, images, fmt), mimetype='application/zip',
+                                 headers={'Content-Disposition': f'attachment; filename="{name}.zip"'})
+
+# Cache the data loading function (per dataset version)
+def read_data(version):
+    return shared_cache.cached(shared_cache.make_key('dataset', version), lambda: datastore.query(DATA_SOURCE),
+                               shared_cache.encode_frame, shared_cache.decode_frame, TIMEOUT, local=local_cache)
+
 def load_data():
-    return pd.read_excel('well_being_data.xlsx')  #Update the filename or filepath if needed
+    """Return the dataset, read only once per version in this process
+
+    Under gunicorn --preload it is loaded in the master process and shared with the workers copy-on-write
+    (see gunicorn.conf.py).
+    """
+    return datastore.derived(DATA_SOURCE, 'dataset', lambda: read_data(datastore.source_version(DATA_SOURCE)))
+
+def select_rows(conditions, columns=None):
+    """Rows of the well-being data where each column equals the given value, or one of the given values (list)"""
+    if DATA_BACKEND == 'sqlite':
+        return sql_store.select_rows(DATA_SOURCE, conditions, columns)
+
+    df = load_data()
+    mask = np.ones(len(df), dtype=bool)
+    for column, value in conditions.items():
+        matches = df[column].isin(value) if isinstance(value, (list, tuple, set)) else df[column] == value
+        mask &= matches.to_numpy()
+    return df[mask] if columns is None else df.loc[mask, list(columns)]
+
+def distinct_rows(columns, key=None):
+    """Distinct rows of the columns of the well-being data (the first row of each distinct key), in file order"""
+    if DATA_BACKEND == 'sqlite':
+        return sql_store.distinct_rows(DATA_SOURCE, columns, key)
+    return load_data()[columns].drop_duplicates(key).reset_index(drop=True)
+
+def data_columns():
+    """Column names of the well-being data"""
+    if DATA_BACKEND == 'sqlite':
+        return sql_store.ensure_table(DATA_SOURCE)
+    return load_data().columns.tolist()
+
+# Only the totals (no age, sex or education breakdown) are overlaid
+TOTALS = {'AGE': '_T', 'SEX': '_T', 'EDUCATION_LEV': '_T'}
+
+def build_measure_pivots():
+    """Build the per-measure (year x economy) pivots of total values and the measure details
+
+    With the sqlite backend the pivots are read one measure at a time, as they are needed (see get_measure_pivot).
+    """
+    pivots = {}
+    if DATA_BACKEND != 'sqlite':
+        total_data = select_rows(TOTALS)
+        
+        # A single pivot for all measures, then split into one (year x economy) matrix per measure
+        wide = total_data.pivot_table(index='TIME_PERIOD', columns=['MEASURE', 'Reference area'],
+                                      values='OBS_VALUE', aggfunc='first')
+        for measure in wide.columns.get_level_values('MEASURE').unique():
+            pivots[measure] = wide[measure].dropna(how='all')
+    
+    # Measure details used for chart titles and axis labels
+    detail_columns = ['MEASURE', 'Domain', 'Measure', 'Unit of measure']
+    if 'Name' in data_columns():
+        detail_columns.append('Name')
+    measures = distinct_rows(detail_columns, key=['MEASURE']).set_index('MEASURE').sort_index()
+    
+    return pivots, measures
+
+def get_measure_pivots():
+    """Return the per-measure pivots and the measure details, rebuilt only when the dataset version changes"""
+    return datastore.derived(DATA_SOURCE, 'measure_pivots', build_measure_pivots)
+
+def get_measure_pivot(measure):
+    """Return the (year x economy) pivot of the total values of a measure, or None without total values"""
+    pivots, _ = get_measure_pivots()
+    
+    if DATA_BACKEND == 'sqlite' and measure not in pivots:
+        total_data = select_rows({'MEASURE': measure, **TOTALS}, columns=['TIME_PERIOD', 'Reference area', 'OBS_VALUE'])
+        pivots[measure] = total_data.pivot_table(index='TIME_PERIOD', columns='Reference area', values='OBS_VALUE',
+                                                 aggfunc='first') if not total_data.empty else None
+    
+    return pivots.get(measure)
+
+# Only the totals and the sex breakdown are compared
+COMPARED = {'AGE': '_T', 'EDUCATION_LEV': '_T', 'SEX': ['_T', 'M', 'F']}
+COMPARISON_COLUMNS = ['MEASURE', 'SEX', 'TIME_PERIOD', 'Reference area', 'OBS_VALUE']
+
+def build_comparison_index(df):
+    """Build the per-year comparison and statistics of each measure and sex of the compared rows
+
+    {(measure, sex): {'years': {year: (economies, values)}, 'stats': {year: {'count', 'min', 'max'}},
+                      'economy_years': {economy: [years]}, 'x_range': [min, max]}}
+    The economies of each year are sorted by value (descending), so the comparison of any year is a lookup.
+    The x range covers all years of the measure and sex (with 10% padding), so it stays fixed as the year changes.
+    """
+    # One value per economy and year
+    df = df.drop_duplicates(['MEASURE', 'SEX', 'TIME_PERIOD', 'Reference area'])
+    if df.empty:
+        return {}
+    
+    # A single sort for all measures, then split into one slice per measure, sex and year
+    df = df.sort_values(['MEASURE', 'SEX', 'TIME_PERIOD', 'OBS_VALUE', 'Reference area'],
+                        ascending=[True, True, True, False, True])
+    measures = df['MEASURE'].to_numpy()
+    sexes = df['SEX'].to_numpy()
+    years = df['TIME_PERIOD'].to_numpy()
+    economies = df['Reference area'].to_numpy()
+    values = df['OBS_VALUE'].to_numpy(dtype=float)
+    
+    # Rows where a new (measure, sex, year) slice starts
+    new_slice = np.ones(len(df), dtype=bool)
+    new_slice[1:] = (measures[1:] != measures[:-1]) | (sexes[1:] != sexes[:-1]) | (years[1:] != years[:-1])
+    starts = np.flatnonzero(new_slice)
+    ends = np.append(starts[1:], len(df))
+    
+    index = {}
+    for start, end in zip(starts, ends):
+        entry = index.setdefault((measures[start], sexes[start]),
+                                 {'years': {}, 'stats': {}, 'economy_years': {}, 'x_range': None})
+        entry['years'][years[start].item()] = (economies[start:end], values[start:end])
+    
+    # The number of economies and the range of the values of each measure, sex and year in one aggregation
+    stats = df.groupby(['MEASURE', 'SEX', 'TIME_PERIOD'], sort=False).agg(
+        count=('Reference area', 'nunique'), min=('OBS_VALUE', 'min'), max=('OBS_VALUE', 'max'))
+    for (measure, sex, year), count, year_min, year_max in stats.itertuples(name=None):
+        index[(measure, sex)]['stats'][year] = {'count': count, 'min': year_min, 'max': year_max}
+    
+    # The years of each economy, in order (the rows are sorted by year within each measure and sex)
+    economy_years = df.groupby(['MEASURE', 'SEX', 'Reference area'], sort=False)['TIME_PERIOD'].agg(list)
+    for (measure, sex, economy), years_of_economy in economy_years.items():
+        index[(measure, sex)]['economy_years'][economy] = years_of_economy
+    
+    for entry in index.values():
+        entry['x_range'] = padded_range(entry, entry['stats'])
+    
+    return index
+
+def load_comparison_index():
+    """Build the comparison index of all measures, or an empty one with the sqlite backend (see get_comparison_entry)"""
+    if DATA_BACKEND == 'sqlite':
+        return {}
+    return build_comparison_index(select_rows(COMPARED, columns=COMPARISON_COLUMNS))
+
+def get_comparison_index():
+    """Return the comparison index (see build_comparison_index), rebuilt only when the dataset version changes"""
+    return datastore.derived(DATA_SOURCE, 'comparison_index', load_comparison_index)
+
+def get_comparison_entry(measure, sex):
+    """Return the comparison index entry of a measure and sex, or None when they have no compared values
+
+    With the sqlite backend the rows of a measure are read the first time one of its entries is needed, so only
+    the measures of the domains viewed are held in memory.
+    """
+    index = get_comparison_index()
+    
+    if DATA_BACKEND == 'sqlite':
+        # Measures read into the index of the current dataset version
+        read_measures = datastore.derived(DATA_SOURCE, 'comparison_measures', set)
+        if measure not in read_measures:
+            index.update(build_comparison_index(select_rows({'MEASURE': measure, **COMPARED},
+                                                            columns=COMPARISON_COLUMNS)))
+            read_measures.add(measure)
+    
+    return index.get((measure, sex))
+
+def padded_range(entry, years):
+    """x range covering the values of the given years of a comparison index entry, with 10% padding"""
+    overall_min = np.nanmin([entry['stats'][year]['min'] for year in years])
+    overall_max = np.nanmax([entry['stats'][year]['max'] for year in years])
+    padding = (overall_max - overall_min) * 0.1
+    return [overall_min - padding, overall_max + padding]
 
 # Load data and populate dropdowns
 @app.callback(
     [Output('country-select', 'options'),
-     Output('domain-select', 'options')],
+     Output('domain-select', 'options'),
+     Output('overlay-select', 'options')],
     [Input('country-select', 'id')]  # Dummy input to trigger on load
 )
 def populate_dropdowns(_):
-    # Load the data using the cached function
-    df = load_data()
-    
     # Get unique countries (sorted alphabetically)
-    countries = sorted(df['Reference area'].unique())
+    countries = sorted(distinct_rows(['Reference area'])['Reference area'])
 
     # Create country options with flags
     country_options = []
@@ -212,7 +565,7 @@ def populate_dropdowns(_):
         
         if country_code:
             # Use flag from assets folder
-            flag_path = f'/assets/flags/{country_code}.png'
+            flag_path = http_cache.asset_url(f'flags/{country_code}.png')
             country_options.append({
                 'label': html.Div([
                     html.Img(src=flag_path, className='flag-image'),
@@ -234,34 +587,168 @@ def populate_dropdowns(_):
     #country_options = [{'label': country, 'value': country} for country in countries]
     
     # Get unique domains (sorted by DOMAIN value)
-    domains = df[['DOMAIN', 'Domain']].drop_duplicates()
+    domains = distinct_rows(['DOMAIN', 'Domain'])
     domains = domains.sort_values('DOMAIN')
     domain_options = [{'label': domain, 'value': domain} for domain in domains['Domain'].tolist()]
     
-    return country_options, domain_options
+    return country_options, domain_options, country_options
 
+# Show the year slider in comparison mode, with the years of the selected domain
 @app.callback(
-    Output('charts-container', 'children'),
+    [Output('comparison-year', 'min'),
+     Output('comparison-year', 'max'),
+     Output('comparison-year', 'marks'),
+     Output('comparison-year', 'value'),
+     Output('comparison-year-container', 'style')],
+    [Input('domain-select', 'value'),
+     Input('intl-comparison-checkbox', 'value')]
+)
+def update_comparison_slider(selected_domain, intl_comparison_values):
+    # Changing the domain or the mode goes back to the earliest and latest comparable years
+    if not selected_domain or 'show' not in (intl_comparison_values or []):
+        return 0, 1, {}, None, {'display': 'none'}
+    
+    _, measures = get_measure_pivots()
+    years = set()
+    for measure in measures.index[measures['Domain'] == selected_domain]:
+        for sex in COMPARED['SEX']:
+            entry = get_comparison_entry(measure, sex)
+            if entry is not None:
+                years.update(entry['years'])
+    years = sorted(years)
+    if not years:
+        return 0, 1, {}, None, {'display': 'none'}
+    
+    # Every year is a step of the slider, but only every fifth year (and the first and last) is labelled
+    marks = {year: str(year) if year % 5 == 0 or year in (years[0], years[-1]) else '' for year in years}
+    return years[0], years[-1], marks, None, {'marginTop': '10px'}
+
+# Links to download the data of the current view
+@app.callback(
+    Output('export-links', 'children'),
     [Input('country-select', 'value'),
      Input('domain-select', 'value'),
      Input('intl-comparison-checkbox', 'value')]
 )
-def update_charts(selected_country, selected_domain, intl_comparison_values):
+def update_export_links(selected_country, selected_domain, intl_comparison_values):
+    if not selected_country or not selected_domain:
+        return []
+    
+    if 'show' in (intl_comparison_values or []):
+        query = {'domain': selected_domain, 'view': 'comparison'}
+    else:
+        query = {'economy': selected_country, 'domain': selected_domain}
+    
+    return ["Download the data of this view:"] + [
+        html.A(label, href='/export?' + urlencode({**query, 'format': fmt}))
+        for fmt, label in [('csv', 'CSV'), ('ndjson', 'NDJSON'), ('parquet', 'Parquet')]
+    ]
+
+@app.callback(
+    Output('charts-container', 'children'),
+    [Input('country-select', 'value'),
+     Input('domain-select', 'value'),
+     Input('intl-comparison-checkbox', 'value'),
+     Input('overlay-checkbox', 'value'),
+     Input('overlay-select', 'value'),
+     Input('comparison-year', 'value')]
+)
+def update_charts(selected_country, selected_domain, intl_comparison_values,
+                  overlay_values=None, overlay_countries=None, comparison_year=None):
+    charts = cached_charts(selected_country, selected_domain, intl_comparison_values,
+                           overlay_values, overlay_countries, comparison_year)
+    prefetch_views(selected_country, selected_domain, intl_comparison_values, overlay_values)
+    return charts
+
+def charts_key(selected_country, selected_domain, intl_comparison_values,
+               overlay_values=None, overlay_countries=None, comparison_year=None):
+    """Cache key of the charts: the dataset version and the selection, leaving out the inputs of the modes not shown"""
+    comparison = 'show' in (intl_comparison_values or [])
+    overlay = bool(overlay_values and 'overlay' in overlay_values)
+    return shared_cache.make_key('charts', datastore.source_version(DATA_SOURCE), selected_country, selected_domain,
+                                 comparison, comparison_year if comparison else None, overlay,
+                                 overlay_countries if overlay and not comparison else None)
+
+def cached_charts(selected_country, selected_domain, intl_comparison_values,
+                  overlay_values=None, overlay_countries=None, comparison_year=None):
+    """Return the charts of a selection from the cache, building them on a miss"""
+    key = charts_key(selected_country, selected_domain, intl_comparison_values,
+                     overlay_values, overlay_countries, comparison_year)
+    return shared_cache.cached(key, lambda: build_charts(selected_country, selected_domain, intl_comparison_values,
+                                                         overlay_values, overlay_countries, comparison_year),
+                               shared_cache.encode_json, shared_cache.decode_json, TIMEOUT, local=local_cache)
+
+# Thread pool of the prefetched views (created in each worker process on first use) and the keys of the views
+# waiting in it
+_prefetch = {'executor': None, 'pending': set()}
+_prefetch_lock = threading.Lock()
+
+def lower_thread_priority():
+    """Run a prefetch thread at a lower priority than the requests (Linux sets the nice value of each thread)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+def prefetch_views(selected_country, selected_domain, intl_comparison_values, overlay_values=None):
+    """Build the views a user is likely to open next in the background, so they are in the cache by then
+
+    These are the other domains of the economy (in the same mode) and the comparison of the current domain.
+    Views already in the memory cache, or already waiting, are skipped.
+    """
+    if not selected_country or not selected_domain or (overlay_values and 'overlay' in overlay_values):
+        return
+    
+    _, measures = get_measure_pivots()
+    comparison = ['show'] if 'show' in (intl_comparison_values or []) else []
+    views = [(selected_country, domain, comparison) for domain in measures['Domain'].unique()
+             if domain != selected_domain]
+    if not comparison:
+        views.insert(0, (selected_country, selected_domain, ['show']))
+    
+    with _prefetch_lock:
+        if _prefetch['executor'] is None:
+            _prefetch['executor'] = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='prefetch',
+                                                       initializer=lower_thread_priority)
+        for view in views:
+            key = charts_key(*view)
+            if (key in _prefetch['pending'] or len(_prefetch['pending']) >= PREFETCH_MAX_PENDING
+                    or local_cache.memory_get(key) is not None):
+                continue
+            _prefetch['pending'].add(key)
+            _prefetch['executor'].submit(prefetch_view, key, view)
+
+def prefetch_view(key, view):
+    try:
+        cached_charts(*view)
+    finally:
+        with _prefetch_lock:
+            _prefetch['pending'].discard(key)
+
+def build_charts(selected_country, selected_domain, intl_comparison_values,
+                 overlay_values=None, overlay_countries=None, comparison_year=None):
+    """Create the charts of the selected economy and domain in the selected mode"""
     # If either dropdown is not selected, return empty
     if not selected_country or not selected_domain:
         return html.Div("Please select both an economy and a welfare domain to view data.",
                         style={'textAlign': 'center', 'color': '#666', 'padding': '50px'})
     
-    # Load data from cache
-    df = load_data()
-    
     # If international comparison is enabled (checklist has 'show' value)
+    # Only the totals and the sex breakdown of the domain are compared
     if 'show' in intl_comparison_values:
-        return create_international_comparison(df, selected_country, selected_domain)
+        # A year chosen on the slider is looked up in the precomputed comparison index
+        if comparison_year is not None:
+            return create_year_comparison(selected_country, selected_domain, comparison_year)
+        
+        return create_international_comparison(selected_country, selected_domain)
+    
+    # If the time-series overlay is enabled, show the selected economy together with the others
+    if overlay_values and 'overlay' in overlay_values:
+        return create_overlay_charts(selected_country, selected_domain, overlay_countries or [])
     
     # Otherwise, proceed with regular charts
     # Filter data based on selections
-    filtered_data = df[(df['Reference area'] == selected_country) & (df['Domain'] == selected_domain)]
+    filtered_data = select_rows({'Reference area': selected_country, 'Domain': selected_domain})
     
     if filtered_data.empty:
         return html.Div("No data available for the selected country and domain.", 
@@ -351,59 +838,143 @@ def update_charts(selected_country, selected_domain, intl_comparison_values):
     
     return html.Div(chart_rows)
 
-def create_international_comparison(df, selected_country, selected_domain):
-    """Create horizontal bar charts for international comparison"""
-    # Filter data for the selected domain (all countries)
-    domain_data = df[df['Domain'] == selected_domain]
+def create_overlay_charts(selected_country, selected_domain, overlay_countries):
+    """Create line charts overlaying the time series of the selected economy and other economies"""
+    _, measures = get_measure_pivots()
     
-    # Group by measure
-    measure_groups = domain_data.groupby('MEASURE')
+    # The selected economy always comes first, followed by the overlaid economies
+    economies = [selected_country] + [c for c in overlay_countries if c != selected_country]
+    
+    overlay_charts = []
+    
+    for measure, measure_info in measures[measures['Domain'] == selected_domain].iterrows():
+        pivot = get_measure_pivot(measure)
+        
+        # Skip measures without total data for the selected economy
+        if pivot is None or selected_country not in pivot.columns:
+            continue
+        
+        # Re-slice the cached (year x economy) matrix for the economies to show
+        matrix = pivot[[c for c in economies if c in pivot.columns]].dropna(how='all')
+        
+        measure_name = measure_info['Measure']
+        measure_label = measure_info['Name'] if 'Name' in measure_info.index else measure_name
+        full_unit = measure_info['Unit of measure']
+        unit_of_measure = 'Percentage' if 'percentage' in full_unit.lower() else full_unit
+        
+        overlay_chart = create_overlay_chart(matrix, selected_country, measure_label, measure_name, unit_of_measure)
+        overlay_charts.append(html.Div(overlay_chart, className="chart-container"))
+    
+    if not overlay_charts:
+        return html.Div("No data available for the selected economy and domain.", 
+                        style={'textAlign': 'center', 'color': '#666', 'padding': '50px'})
+    
+    return html.Div(overlay_charts)
+
+def create_overlay_chart(matrix, selected_country, label, measure, unit_of_measure):
+    """Create a line chart with one trace per economy from a (year x economy) matrix"""
+    time_points = set()
+    traces = []
+    
+    for country in matrix.columns:
+        series = matrix[country].dropna()
+        years, values = downsample_series(series.index.tolist(), series.tolist())
+        time_points.update(years)
+        
+        # Highlight the selected economy
+        if country == selected_country:
+            traces.append(create_line_trace(years, values, name=country, line=dict(width=4), 
+                                            marker=dict(size=8)))
+        else:
+            traces.append(create_line_trace(years, values, name=country, line=dict(width=2), 
+                                            marker=dict(size=5)))
+    
+    fig = go.Figure(data=traces)
+    
+    # Format: "{Bold Name}: {Measure}", wrapped for long titles
+    full_title = f"<b>{label}</b>: {measure}"
+    wrapped_lines = textwrap.wrap(full_title, width=80, break_long_words=False)
+    top_margin = 70 + (len(wrapped_lines) - 1) * 10
+    
+    fig.update_layout(
+        title={
+            'text': '<br>'.join(wrapped_lines),
+            'y': 0.97,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': {'family': 'Arial'}
+        },
+        xaxis=dict(
+            title='Year',
+            type='category',
+            categoryorder='array',
+            categoryarray=sorted(time_points),
+            titlefont={'family': 'Arial'}
+        ),
+        yaxis=dict(
+            title=unit_of_measure,
+            titlefont={'family': 'Arial'}
+        ),
+        # Place legend in a single horizontal row below the chart
+        legend=dict(
+            orientation='h',
+            yanchor='top',
+            y=-0.20,
+            xanchor='center',
+            x=0.5,
+            font={'family': 'Arial'},
+            traceorder='normal'  # Keep the selected economy as the first item
+        ),
+        margin=dict(l=60, r=30, t=top_margin, b=100),
+        hovermode='closest',
+        height=430 + (len(wrapped_lines) - 1) * 10,
+        font={'family': 'Arial'}
+    )
+    
+    return dcc.Graph(figure=fig, config={'displayModeBar': False})
+
+def create_international_comparison(selected_country, selected_domain):
+    """Create horizontal bar charts for international comparison"""
+    # The measures of the selected domain, whose values are looked up in the comparison index
+    _, measures = get_measure_pivots()
     
     comparison_charts = []
     
-    for measure, measure_data in measure_groups:
+    for measure, details in measures[measures['Domain'] == selected_domain].iterrows():
         # Get measure details
-        measure_name = measure_data['Measure'].iloc[0]
-        measure_label = measure_data['Name'].iloc[0] if 'Name' in measure_data.columns else measure_name
+        measure_name = details['Measure']
+        measure_label = details['Name'] if 'Name' in details.index else measure_name
         
         # Get unit of measure
-        full_unit = measure_data['Unit of measure'].iloc[0]
+        full_unit = details['Unit of measure']
         unit_of_measure = 'Percentage' if 'percentage' in full_unit.lower() else full_unit
         
         # Special handling for Life Expectancy - compare by sex instead of total
         # Check the 'Name' column for "Life Expectancy"
         if "Life expectancy" in measure_label:
             # Create male comparison with simplified title
-            male_charts = create_sex_specific_comparison(measure_data, selected_country, measure_label, 
+            male_charts = create_sex_specific_comparison(measure, selected_country, measure_label, 
                                                       "Male", 'M', unit_of_measure)
             if male_charts:
                 comparison_charts.append(male_charts)
                 
             # Create female comparison with simplified title
-            female_charts = create_sex_specific_comparison(measure_data, selected_country, measure_label, 
+            female_charts = create_sex_specific_comparison(measure, selected_country, measure_label, 
                                                         "Female", 'F', unit_of_measure)
             if female_charts:
                 comparison_charts.append(female_charts)
         else:
-            # For all other measures, use the standard total data approach
-            # We only want the total data (no breakdowns)
-            total_data = measure_data[(measure_data['AGE'] == '_T') & 
-                                   (measure_data['SEX'] == '_T') & 
-                                   (measure_data['EDUCATION_LEV'] == '_T')]
-            
-            if total_data.empty:
-                continue
-                
-            # Get the selected country's data
-            selected_country_data = total_data[total_data['Reference area'] == selected_country]
+            # For all other measures, compare the totals (no breakdowns) from the comparison index
+            entry = get_comparison_entry(measure, '_T')
             
             # If there's no data for the selected country, skip this measure
-            if selected_country_data.empty:
+            if entry is None or selected_country not in entry['economy_years']:
                 continue
             
             # Get comparable years data
-            earliest_year_info = find_comparable_year(total_data, selected_country, 'earliest')
-            latest_year_info = find_comparable_year(total_data, selected_country, 'latest')
+            earliest_year_info = find_comparable_year(entry, selected_country, 'earliest')
+            latest_year_info = find_comparable_year(entry, selected_country, 'latest')
             
             # If only the selected country has data (no comparison possible), skip this measure
             if earliest_year_info['comparison_count'] < 2 and latest_year_info['comparison_count'] < 2:
@@ -412,23 +983,7 @@ def create_international_comparison(df, selected_country, selected_domain):
             # Find the combined range for x-axis to standardize between charts
             combined_x_range = None
             if earliest_year_info['comparison_count'] >= 2 and latest_year_info['comparison_count'] >= 2 and earliest_year_info['year'] != latest_year_info['year']:
-                # Get data for earliest year
-                earliest_year_data = total_data[total_data['TIME_PERIOD'] == earliest_year_info['year']]
-                earliest_min = earliest_year_data['OBS_VALUE'].min()
-                earliest_max = earliest_year_data['OBS_VALUE'].max()
-                
-                # Get data for latest year
-                latest_year_data = total_data[total_data['TIME_PERIOD'] == latest_year_info['year']]
-                latest_min = latest_year_data['OBS_VALUE'].min()
-                latest_max = latest_year_data['OBS_VALUE'].max()
-                
-                # Find overall min and max
-                overall_min = min(earliest_min, latest_min)
-                overall_max = max(earliest_max, latest_max)
-                
-                # Add some padding (10%)
-                padding = (overall_max - overall_min) * 0.1
-                combined_x_range = [overall_min - padding, overall_max + padding]
+                combined_x_range = padded_range(entry, [earliest_year_info['year'], latest_year_info['year']])
             
             # Create a container for this measure's charts
             measure_container = html.Div(
@@ -446,7 +1001,7 @@ def create_international_comparison(df, selected_country, selected_domain):
             if earliest_year_info['year'] == latest_year_info['year']:
                 # Create only latest year chart (which is the same as earliest)
                 if latest_year_info['comparison_count'] >= 2:
-                    latest_chart = create_comparison_chart(total_data, selected_country, 
+                    latest_chart = create_comparison_chart(entry, selected_country, 
                                                           measure_label, measure_name, 
                                                           latest_year_info, unit_of_measure)
                     
@@ -465,7 +1020,7 @@ def create_international_comparison(df, selected_country, selected_domain):
                 
                 # Only add earliest chart if there's something to compare with
                 if earliest_year_info['comparison_count'] >= 2:
-                    earliest_chart = create_comparison_chart(total_data, selected_country, 
+                    earliest_chart = create_comparison_chart(entry, selected_country, 
                                                             measure_label, measure_name, 
                                                             earliest_year_info, unit_of_measure,
                                                             x_range=combined_x_range)
@@ -479,7 +1034,7 @@ def create_international_comparison(df, selected_country, selected_domain):
                 
                 # Only add latest chart if there's something to compare with
                 if latest_year_info['comparison_count'] >= 2:
-                    latest_chart = create_comparison_chart(total_data, selected_country, 
+                    latest_chart = create_comparison_chart(entry, selected_country, 
                                                           measure_label, measure_name, 
                                                           latest_year_info, unit_of_measure,
                                                           x_range=combined_x_range)
@@ -504,26 +1059,73 @@ def create_international_comparison(df, selected_country, selected_domain):
     
     return html.Div(comparison_charts)
 
-def create_sex_specific_comparison(measure_data, selected_country, label, sex_display, sex_code, unit_of_measure):
-    """Create sex-specific comparison charts for measures like Life Expectancy"""
-    # Filter data for the specified sex
-    sex_data = measure_data[(measure_data['AGE'] == '_T') & 
-                         (measure_data['SEX'] == sex_code) & 
-                         (measure_data['EDUCATION_LEV'] == '_T')]
+def create_year_comparison(selected_country, selected_domain, year):
+    """Create horizontal bar charts comparing the economies in one year, for each measure of the domain"""
+    _, measures = get_measure_pivots()
     
-    if sex_data.empty:
-        return None
+    comparison_charts = []
     
-    # Get the selected country's data
-    selected_country_data = sex_data[sex_data['Reference area'] == selected_country]
+    for measure, details in measures[measures['Domain'] == selected_domain].iterrows():
+        measure_name = details['Measure']
+        measure_label = details['Name'] if 'Name' in details.index else measure_name
+        
+        full_unit = details['Unit of measure']
+        unit_of_measure = 'Percentage' if 'percentage' in full_unit.lower() else full_unit
+        
+        # Life expectancy is compared by sex, all other measures by their totals
+        if "Life expectancy" in measure_label:
+            slices = [('M', "Male"), ('F', "Female")]
+        else:
+            slices = [('_T', measure_name)]
+        
+        charts = []
+        for sex_code, title_measure in slices:
+            entry = get_comparison_entry(measure, sex_code)
+            if entry is None or year not in entry['years']:
+                continue
+            
+            # Only compare when the selected economy and at least one other economy have data for the year
+            economies, values = entry['years'][year]
+            if len(economies) < 2 or selected_country not in economies:
+                continue
+            
+            charts.append(create_comparison_figure(economies, values, selected_country, measure_label,
+                                                   title_measure, year, f"Comparable data ({year})",
+                                                   unit_of_measure, x_range=entry['x_range']))
+        
+        if not charts:
+            continue
+        
+        # Two charts side by side (male and female), or a single chart in the middle
+        chart_style = {'width': '48.5%'} if len(charts) == 2 else {'width': '70%', 'margin': '0 auto'}
+        comparison_charts.append(html.Div(
+            [html.Div(chart, style=chart_style, className="chart-container") for chart in charts],
+            style={
+                'display': 'flex',
+                'flexWrap': 'wrap',
+                'justifyContent': 'space-between',
+                'marginBottom': '40px'
+            }
+        ))
+    
+    if not comparison_charts:
+        return html.Div(f"No comparable data available for international comparison in {year}.", 
+                      style={'textAlign': 'center', 'color': '#666', 'padding': '50px'})
+    
+    return html.Div(comparison_charts)
+
+def create_sex_specific_comparison(measure, selected_country, label, sex_display, sex_code, unit_of_measure):
+    """Create sex-specific comparison charts for measures like Life Expectancy"""
+    # The comparison of the measure for the specified sex (see build_comparison_index)
+    entry = get_comparison_entry(measure, sex_code)
     
     # If there's no data for the selected country, skip
-    if selected_country_data.empty:
+    if entry is None or selected_country not in entry['economy_years']:
         return None
     
     # Get comparable years data
-    earliest_year_info = find_comparable_year(sex_data, selected_country, 'earliest')
-    latest_year_info = find_comparable_year(sex_data, selected_country, 'latest')
+    earliest_year_info = find_comparable_year(entry, selected_country, 'earliest')
+    latest_year_info = find_comparable_year(entry, selected_country, 'latest')
     
     # If only the selected country has data (no comparison possible), skip
     if earliest_year_info['comparison_count'] < 2 and latest_year_info['comparison_count'] < 2:
@@ -532,23 +1134,7 @@ def create_sex_specific_comparison(measure_data, selected_country, label, sex_di
     # Find the combined range for x-axis to standardize between charts
     combined_x_range = None
     if earliest_year_info['comparison_count'] >= 2 and latest_year_info['comparison_count'] >= 2 and earliest_year_info['year'] != latest_year_info['year']:
-        # Get data for earliest year
-        earliest_year_data = sex_data[sex_data['TIME_PERIOD'] == earliest_year_info['year']]
-        earliest_min = earliest_year_data['OBS_VALUE'].min()
-        earliest_max = earliest_year_data['OBS_VALUE'].max()
-        
-        # Get data for latest year
-        latest_year_data = sex_data[sex_data['TIME_PERIOD'] == latest_year_info['year']]
-        latest_min = latest_year_data['OBS_VALUE'].min()
-        latest_max = latest_year_data['OBS_VALUE'].max()
-        
-        # Find overall min and max
-        overall_min = min(earliest_min, latest_min)
-        overall_max = max(earliest_max, latest_max)
-        
-        # Add some padding (10%)
-        padding = (overall_max - overall_min) * 0.1
-        combined_x_range = [overall_min - padding, overall_max + padding]
+        combined_x_range = padded_range(entry, [earliest_year_info['year'], latest_year_info['year']])
     
     # Create a container for this measure's charts
     measure_container = html.Div(
@@ -566,7 +1152,7 @@ def create_sex_specific_comparison(measure_data, selected_country, label, sex_di
     if earliest_year_info['year'] == latest_year_info['year']:
         # Create only latest year chart (which is the same as earliest)
         if latest_year_info['comparison_count'] >= 2:
-            latest_chart = create_comparison_chart(sex_data, selected_country, 
+            latest_chart = create_comparison_chart(entry, selected_country, 
                                                   label, sex_display, 
                                                   latest_year_info, unit_of_measure)
             
@@ -585,7 +1171,7 @@ def create_sex_specific_comparison(measure_data, selected_country, label, sex_di
         
         # Only add earliest chart if there's something to compare with
         if earliest_year_info['comparison_count'] >= 2:
-            earliest_chart = create_comparison_chart(sex_data, selected_country, 
+            earliest_chart = create_comparison_chart(entry, selected_country, 
                                                     label, sex_display, 
                                                     earliest_year_info, unit_of_measure,
                                                     x_range=combined_x_range)
@@ -599,7 +1185,7 @@ def create_sex_specific_comparison(measure_data, selected_country, label, sex_di
         
         # Only add latest chart if there's something to compare with
         if latest_year_info['comparison_count'] >= 2:
-            latest_chart = create_comparison_chart(sex_data, selected_country, 
+            latest_chart = create_comparison_chart(entry, selected_country, 
                                                   label, sex_display, 
                                                   latest_year_info, unit_of_measure,
                                                   x_range=combined_x_range)
@@ -621,74 +1207,27 @@ def create_sex_specific_comparison(measure_data, selected_country, label, sex_di
     return None
 
 
-def find_comparable_year(measure_data, selected_country, year_type):
-    """Find a year with comparable data and return information about it"""
-    # Get selected country's data
-    selected_country_data = measure_data[measure_data['Reference area'] == selected_country]
-    
-    # Sort by time period
-    selected_country_data = selected_country_data.sort_values('TIME_PERIOD')
-    
-    # Get all available years for the selected country
-    available_years = selected_country_data['TIME_PERIOD'].tolist()
-    
-    # Find a year with comparable data
-    target_year = None
-    comparison_count = 0
-    
-    if year_type == 'earliest':
-        # Try each year from earliest to latest
-        for year in available_years:
-            # Get all countries with data for this year
-            year_data = measure_data[measure_data['TIME_PERIOD'] == year]
-            # Count unique countries
-            current_count = year_data['Reference area'].nunique()
-            # If we have at least two countries (including the selected one)
-            if current_count >= 2:
-                target_year = year
-                comparison_count = current_count
-                break
-        
-        # If we couldn't find a year with multiple countries, just use the earliest
-        if target_year is None and available_years:
-            target_year = available_years[0]
-            year_data = measure_data[measure_data['TIME_PERIOD'] == target_year]
-            comparison_count = year_data['Reference area'].nunique()
-            
-        year_info = {
-            'year': target_year,
-            'comparison_count': comparison_count,
-            'type': 'earliest'
-        }
-            
-    else:  # latest
-        # Try each year from latest to earliest
-        for year in reversed(available_years):
-            # Get all countries with data for this year
-            year_data = measure_data[measure_data['TIME_PERIOD'] == year]
-            # Count unique countries
-            current_count = year_data['Reference area'].nunique()
-            # If we have at least two countries (including the selected one)
-            if current_count >= 2:
-                target_year = year
-                comparison_count = current_count
-                break
-        
-        # If we couldn't find a year with multiple countries, just use the latest
-        if target_year is None and available_years:
-            target_year = available_years[-1]
-            year_data = measure_data[measure_data['TIME_PERIOD'] == target_year]
-            comparison_count = year_data['Reference area'].nunique()
-            
-        year_info = {
-            'year': target_year,
-            'comparison_count': comparison_count,
-            'type': 'latest'
-        }
-    
-    return year_info
+def find_comparable_year(entry, selected_country, year_type):
+    """Find a year with comparable data in a comparison index entry and return information about it"""
+    # All available years for the selected country, from earliest to latest
+    available_years = entry['economy_years'].get(selected_country, [])
+    
+    # Try each year from earliest to latest (or latest to earliest) for one with at least two economies
+    # (including the selected one)
+    ordered_years = available_years if year_type == 'earliest' else available_years[::-1]
+    target_year = next((year for year in ordered_years if entry['stats'][year]['count'] >= 2), None)
+    
+    # If we couldn't find a year with multiple countries, just use the earliest (or latest)
+    if target_year is None and ordered_years:
+        target_year = ordered_years[0]
+    
+    return {
+        'year': target_year,
+        'comparison_count': entry['stats'][target_year]['count'] if target_year is not None else 0,
+        'type': year_type
+    }
 
-def create_comparison_chart(measure_data, selected_country, label, measure, year_info, unit_of_measure, x_range=None):
+def create_comparison_chart(entry, selected_country, label, measure, year_info, unit_of_measure, x_range=None):
     """Create a horizontal bar chart for international comparison for the selected country's earliest/latest year"""
     target_year = year_info['year']
     year_type = year_info['type']
@@ -703,55 +1242,42 @@ def create_comparison_chart(measure_data, selected_country, label, measure, year
             config={'displayModeBar': False}
         )
     
-    # Filter to only include the target year
-    year_data = measure_data[measure_data['TIME_PERIOD'] == target_year]
-    
-    # Create list of countries with data for this year
-    countries_data = []
-    
-    for country, country_data in year_data.groupby('Reference area'):
-        # Just take the first row as we're already filtered to a specific year
-        data_row = country_data.iloc[0]
-        
-        countries_data.append({
-            'Country': country,
-            'Year': target_year,
-            'Value': data_row['OBS_VALUE'],
-            'IsSelected': country == selected_country
-        })
-    
-    # Convert to DataFrame and sort by value (descending)
-    comparison_df = pd.DataFrame(countries_data)
-    comparison_df = comparison_df.sort_values('Value', ascending=False)
+    # The economies with data for this year, already sorted by value (descending)
+    countries, values = entry['years'][target_year]
     
+    year_label = "Earliest" if year_type == 'earliest' else "Latest"
+    return create_comparison_figure(countries, values, selected_country, label, measure,
+                                    target_year, f"{year_label} comparable data ({target_year})", unit_of_measure, x_range)
+
+def create_comparison_figure(countries, values, selected_country, label, measure, target_year, year_text,
+                             unit_of_measure, x_range=None):
+    """Create the horizontal bar chart of one year from the economies and values sorted by value (descending)"""
     # Get count of countries for subtitle
-    country_count = len(comparison_df)
+    country_count = len(countries)
     
     # Create the horizontal bar chart
     fig = go.Figure()
     
     # Add bars for each country
-    for _, row in comparison_df.iterrows():
+    for country, value in zip(countries, values):
         # Set color based on whether this is the selected country
-        color = 'rgb(31, 119, 180)' if row['IsSelected'] else 'rgb(158, 202, 225)'
+        color = 'rgb(31, 119, 180)' if country == selected_country else 'rgb(158, 202, 225)'
         
         fig.add_trace(go.Bar(
-            x=[row['Value']],
-            y=[row['Country']],
+            x=[value],
+            y=[country],
             orientation='h',
             marker=dict(color=color),
-            name=row['Country'],
+            name=country,
             showlegend=False,
             hovertemplate=
             '<b>%{y}</b><br>' +
             'Value: %{x:.2f}<br>' +  # Added formatting to show 2 decimal places
-            'Year: ' + str(row['Year']) +
+            'Year: ' + str(target_year) +
             '<extra></extra>'
         ))
     
     # Construct chart title with more intelligent line breaks
-    year_label = "Earliest" if year_type == 'earliest' else "Latest"
-    
     # Combine label and measure for title
     combined_title = f"{label}: {measure}"
     
@@ -804,11 +1330,11 @@ def create_comparison_chart(measure_data, selected_country, label, measure, year
         title_part = title_line1
     
     # Add the year and comparison info as the last line
-    comparison_info = f"{year_label} comparable data ({target_year}) - Comparison with {country_count-1} other economies"
+    comparison_info = f"{year_text} - Comparison with {country_count-1} other economies"
     full_title = f"{title_part}<br><span style='font-size:0.7em;'>{comparison_info}</span>"
     
     # Calculate dynamic height based on number of countries
-    chart_height = max(450, 100 + 20 * len(comparison_df))
+    chart_height = max(450, 100 + 20 * country_count)
     
     # Calculate top margin based on number of title lines (more lines need more space)
     # Reduced spacing by lowering the base margin and per-line addition
@@ -859,6 +1385,68 @@ def create_comparison_chart(measure_data, selected_country, label, measure, year
     return dcc.Graph(figure=fig, config={'displayModeBar': False, 'responsive': True})
 
 
+def downsample_series(x, y, max_points=None):
+    """Downsample a series with Largest-Triangle-Three-Buckets (LTTB) so that its visual shape is kept"""
+    if max_points is None:
+        max_points = MAX_LINE_POINTS
+    
+    n = len(y)
+    # Nothing to do for short series (LTTB needs at least the first, last and one middle point)
+    if n <= max_points or max_points < 3:
+        return list(x), list(y)
+    
+    # Use positions rather than the x values themselves, as periods may be labels such as '2023-Q1'
+    positions = np.arange(n, dtype=float)
+    values = np.asarray(y, dtype=float)
+    
+    # Always keep the first and last points; the rest are split into equal-sized buckets
+    bucket_size = (n - 2) / (max_points - 2)
+    selected = [0]
+    previous = 0
+    
+    for i in range(max_points - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+        
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = bucket_end
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = positions[next_start:next_end].mean()
+        avg_y = values[next_start:next_end].mean()
+        
+        # Pick the point in this bucket forming the largest triangle with the previous pick and the average
+        areas = np.abs((positions[previous] - avg_x) * (values[bucket_start:bucket_end] - values[previous]) -
+                       (positions[previous] - positions[bucket_start:bucket_end]) * (avg_y - values[previous]))
+        previous = bucket_start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        selected.append(previous)
+    
+    selected.append(n - 1)
+    
+    return [x[i] for i in selected], [y[i] for i in selected]
+
+def create_line_trace(years, values, name, line=None, marker=None, visible=True):
+    """Create a line trace, switching to WebGL for dense series"""
+    if len(years) > WEBGL_POINT_THRESHOLD:
+        # Markers on every point add nothing for dense series and slow down rendering
+        return go.Scattergl(
+            x=years,
+            y=values,
+            mode='lines',
+            name=name,
+            line=line,
+            visible=visible
+        )
+    
+    return go.Scatter(
+        x=years,
+        y=values,
+        mode='lines+markers',
+        name=name,
+        line=line,
+        marker=marker,
+        visible=visible
+    )
+
 def create_chart_component(label, measure, breakdown_type, total_data, breakdown_data, 
                           breakdown_code, breakdown_label, charts_in_row=1):
     # Prepare data for the chart
@@ -882,14 +1470,13 @@ def create_chart_component(label, measure, breakdown_type, total_data, breakdown
         years = total_data['TIME_PERIOD'].tolist()
         values = total_data['OBS_VALUE'].tolist()
         
-        time_points.update(years)
-        
         if len(years) >= 4:
-            # Line chart
-            traces.append(go.Scatter(
-                x=years,
-                y=values,
-                mode='lines+markers',
+            # Line chart (WebGL and downsampled if the series is dense)
+            years, values = downsample_series(years, values)
+            time_points.update(years)
+            traces.append(create_line_trace(
+                years,
+                values,
                 name='Total',
                 line=dict(width=4),
                 marker=dict(size=8),
@@ -897,6 +1484,7 @@ def create_chart_component(label, measure, breakdown_type, total_data, breakdown
             ))
         else:
             # Bar chart
+            time_points.update(years)
             traces.append(go.Bar(
                 x=years,
                 y=values,
@@ -918,20 +1506,21 @@ def create_chart_component(label, measure, breakdown_type, total_data, breakdown
         for breakdown_value, group_data in breakdown_groups:
             years = group_data['TIME_PERIOD'].tolist()
             values = group_data['OBS_VALUE'].tolist()
-            time_points.update(years)
             
             if len(years) >= 4:
-                # Line chart
-                traces.append(go.Scatter(
-                    x=years,
-                    y=values,
-                    mode='lines+markers',
+                # Line chart (WebGL and downsampled if the series is dense)
+                years, values = downsample_series(years, values)
+                time_points.update(years)
+                traces.append(create_line_trace(
+                    years,
+                    values,
                     name=breakdown_value,
                     marker=dict(size=6),
                     visible='legendonly'  # Hide breakdowns initially
                 ))
             else:
                 # Bar chart
+                time_points.update(years)
                 traces.append(go.Bar(
                     x=years,
                     y=values,
@@ -1022,5 +1611,25 @@ def create_chart_component(label, measure, breakdown_type, total_data, breakdown
     
     return dcc.Graph(figure=fig, config={'displayModeBar': False})
 
+def warm_up():
+    """Load the dataset and build the derived data and figures of all pages in this process
+
+    Called by gunicorn in the master process before the workers are forked (see gunicorn.conf.py).
+    With the sqlite backend only the measure details are preloaded: the workers read the rows they need, and
+    neither the whole dataset nor the data derived from most of it (the comparison index, the overview) is held
+    in the master process and shared with every worker.
+    """
+    with server.app_context():
+        http_cache.compress_assets()
+        get_measure_pivots()
+        if DATA_BACKEND != 'sqlite':
+            load_data()
+            get_comparison_index()
+            overview_page.get_overview_matrix()
+        sector_race_page.get_race_figure()
+        pyramid_page.get_pyramid_data()
+        # The SQLite copy is read by the sqlite backend and the /export endpoint
+        sql_store.ensure_table(DATA_SOURCE)
+
 if __name__ == '__main__':
     app.run_server(debug=False)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import sql_store
+
+# Downloads of the rows of a data store source, streamed as they are read, e.g.
+#   data_export.stream_rows('well_being', {'Domain': 'Health'}, 'csv')
+# The rows are read from the indexed SQLite copy (see sql_store.py) one chunk at a time and each chunk is written
+# out before the next is read, so an export of the whole dataset uses no more memory than a small one.
+
+# Rows read and written at a time
+CHUNK_ROWS = 5000
+
+FORMATS = {
+    'csv': {'mimetype': 'text/csv', 'extension': 'csv'},
+    'ndjson': {'mimetype': 'application/x-ndjson', 'extension': 'ndjson'},
+    'parquet': {'mimetype': 'application/vnd.apache.parquet', 'extension': 'parquet'}
+}
+
+def csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(columns, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+def parquet_chunks(columns, types, chunks):
+    """One row group per chunk; the bytes written so far are sent after each row group and the footer at the end"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {'TEXT': pa.string(), 'REAL': pa.float64(), 'INTEGER': pa.int64()}
+    schema = pa.schema([(column, arrow_types.get(types[column], pa.string())) for column in columns])
+
+    # The writer keeps track of its own position, so the buffer can be emptied after each row group
+    buffer = io.BytesIO()
+    writer = pq.ParquetWriter(buffer, schema, compression='zstd')
+    for rows in chunks:
+        writer.write_table(pa.Table.from_arrays([pa.array(values, type=field.type)
+                                                 for values, field in zip(zip(*rows), schema)], schema=schema))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    yield buffer.getvalue()
+
+def stream_rows(name, conditions, fmt):
+    """Generator of the bytes of the rows of a source matching the conditions (see sql_store.select_rows)"""
+    columns = sql_store.ensure_table(name)
+    chunks = sql_store.iter_rows(name, conditions, chunk_size=CHUNK_ROWS)
+
+    if fmt == 'csv':
+        return csv_chunks(columns, chunks)
+    if fmt == 'ndjson':
+        return ndjson_chunks(columns, chunks)
+    if fmt == 'parquet':
+        return parquet_chunks(columns, sql_store.column_types(name), chunks)
+    raise ValueError(f'Unknown export format: {fmt}')
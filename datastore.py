@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from lazy_imports import lazy_import
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Imported on first use (see lazy_imports.py)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# Local columnar store shared by the dashboard, the population pyramid and the value added race, e.g.
+#   datastore.query('well_being', economies=['Hong Kong'], measures=['LIFE_EXP'])
+# Each source is parsed from its Excel files once per version (content hash) of the files, and kept as Parquet
+# partitioned by economy and measure (datastore/<source>-<version>/economy=<economy>/measure=<measure>/), so a query
+# only reads the partitions it needs.
+# A build is written to its own folder and versions.json is switched to it when it is complete, under a lock shared
+# by all processes (gunicorn workers, the pool workers of the race...), so readers never see a half-written source.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(BASE_DIR, 'datastore')
+
+# Version of the files each source was last built from, with the modification times and sizes of the files it was
+# computed for
+VERSIONS_FILE = os.path.join(STORE_DIR, 'versions.json')
+
+# Held while a process checks and builds the sources
+LOCK_FILE = os.path.join(STORE_DIR, 'build.lock')
+
+def load_well_being(paths):
+    """OECD well-being data, one row per economy, measure, breakdown and year"""
+    return pd.read_excel(paths[0])
+
+def load_population(paths):
+    """Population by year, sex and age group of Hong Kong (one file per sex) and Singapore"""
+    from population_pyramid.population_parser import parse_population_file
+
+    tables = []
+    for path in paths:
+        economy, table = parse_population_file(path)
+        tables.append(table.assign(Economy=economy, Measure='Population'))
+    return pd.concat(tables, ignore_index=True)
+
+def load_sector_value_added(paths):
+    """Nominal value added of Hong Kong by sector and year, in the long format"""
+    from sectoral_value_added_bar_chart_race.sector_data import load_sector_table
+
+    df = load_sector_table(paths[0]).reset_index().melt(id_vars='Year', var_name='Sector', value_name='Value')
+    return df.assign(Economy='Hong Kong', Measure='Nominal value added')
+
+# Sources of the store: the files they are parsed from (relative to the repository) and the columns
+# holding the economy and the measure of each row (update the filenames or filepaths if needed)
+SOURCES = {
+    'well_being': {
+        'files': ['well_being_data.xlsx'],
+        'loader': load_well_being,
+        'economy': 'Reference area',
+        'measure': 'MEASURE'
+    },
+    'population': {
+        'files': [os.path.join('population_pyramid', 'Table 110-01001_male.xlsx'),
+                  os.path.join('population_pyramid', 'Table 110-01001_female.xlsx'),
+                  os.path.join('assets', 'datasets', 'Singapore', 'outputFile_Population.xlsx')],
+        'loader': load_population,
+        'economy': 'Economy',
+        'measure': 'Measure'
+    },
+    'sector_value_added': {
+        'files': [os.path.join('sectoral_value_added_bar_chart_race', 'Table 310-34101.xlsx')],
+        'loader': load_sector_value_added,
+        'economy': 'Economy',
+        'measure': 'Measure'
+    }
+}
+
+def source_files(name):
+    """Full paths of the files of a source"""
+    return [os.path.join(BASE_DIR, path) for path in SOURCES[name]['files']]
+
+def file_stats(name):
+    """Modification times and sizes of the files of a source"""
+    stats = [os.stat(path) for path in source_files(name)]
+    return '-'.join(f"{stat.st_mtime_ns}-{stat.st_size}" for stat in stats)
+
+def content_hash(name):
+    """Short SHA-256 of the content of the files of a source"""
+    digest = hashlib.sha256()
+    for path in source_files(name):
+        file_digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                file_digest.update(block)
+        digest.update(file_digest.digest())
+    return digest.hexdigest()[:16]
+
+# Version of each source in this process: name -> (file stats, version)
+_versions = {}
+
+def source_version(name):
+    """Identify the current version of a source by the content of its files
+
+    The same files give the same version on every instance (their modification times differ between checkouts),
+    so the cache keys made from it are shared by all instances. The files are only hashed again when their
+    modification times or sizes change, and the hash stored with the last build is reused by the other processes.
+    """
+    stats = file_stats(name)
+    if _versions.get(name, (None,))[0] != stats:
+        built = load_versions().get(name)
+        if isinstance(built, dict) and built.get('stats') == stats:
+            version = built['version']
+        else:
+            version = content_hash(name)
+        _versions[name] = (stats, version)
+    return _versions[name][1]
+
+# Data built from the sources in this process (e.g. the arrays of a chart): key -> (version of the source, data)
+_derived = {}
+
+def derived(name, key, build):
+    """Return the data build() makes from a source, building it again only when the version of the source changes"""
+    version = source_version(name)
+    if _derived.get(key, (None,))[0] != version:
+        _derived[key] = (version, build())
+    return _derived[key][1]
+
+def load_versions():
+    if not os.path.exists(VERSIONS_FILE):
+        return {}
+    with open(VERSIONS_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_versions(versions):
+    # Written to a temporary file first and swapped in, so readers switch to a new build in one step
+    temp_path = VERSIONS_FILE + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(versions, f, indent=2)
+    os.replace(temp_path, VERSIONS_FILE)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock of a file across processes, released when the block ends (not reentrant)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            # msvcrt gives up after 10 seconds, so keep trying while another process builds
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        yield
+
+def source_dir(name, version):
+    """Folder of the build of a version of a source"""
+    return os.path.join(STORE_DIR, f'{name}-{version}')
+
+def build_source(name, version):
+    """Parse the files of a source and write them to the folder of its version, partitioned by economy and measure"""
+    # A folder renamed into place is complete (e.g. left by a process stopped before it switched versions.json)
+    if os.path.isdir(source_dir(name, version)):
+        return
+
+    source = SOURCES[name]
+    df = source['loader'](source_files(name))
+
+    # The row number keeps the rows in the order of the files when partitions are read back together
+    df = df.assign(economy=df[source['economy']].astype(str), measure=df[source['measure']].astype(str),
+                   _row=np.arange(len(df)))
+
+    temp_dir = f'{source_dir(name, version)}.tmp-{os.getpid()}'
+    df.to_parquet(temp_dir, partition_cols=['economy', 'measure'], index=False)
+    os.rename(temp_dir, source_dir(name, version))
+
+def remove_old_builds(name, keep):
+    """Remove the folders of a source other than those of the versions kept, and unfinished builds
+
+    The previous version is kept, as processes that have not seen the new files yet may still be reading it.
+    """
+    for entry in os.listdir(STORE_DIR):
+        # Also the unversioned folders of the stores built before the versioned folders
+        unversioned = entry in (name, f'{name}.tmp', f'{name}.old')
+        if unversioned or (entry.startswith(f'{name}-') and entry[len(name) + 1:] not in keep):
+            shutil.rmtree(os.path.join(STORE_DIR, entry), ignore_errors=True)
+
+def is_built(name, version):
+    built = load_versions().get(name)
+    return (isinstance(built, dict) and built.get('version') == version and built.get('stats') == _versions[name][0]
+            and os.path.isdir(source_dir(name, version)))
+
+def ensure_source(name):
+    """Build a source if it is missing from the store or its files have changed, and return its version"""
+    version = source_version(name)
+
+    if not is_built(name, version):
+        with file_lock(LOCK_FILE):
+            # Checked again, as another process may have built it while this one waited for the lock
+            versions = load_versions()
+            built = versions.get(name)
+            # Stores built before the versions were content hashes hold a plain string, and are rebuilt
+            previous = built.get('version') if isinstance(built, dict) else None
+
+            if previous != version or not os.path.isdir(source_dir(name, version)):
+                build_source(name, version)
+                remove_old_builds(name, keep={version, previous})
+
+            # Same content with new modification times (e.g. a new checkout) only updates the stored times, so no
+            # process hashes the files again
+            versions[name] = {'version': version, 'stats': _versions[name][0]}
+            save_versions(versions)
+
+    return version
+
+def partitioning():
+    """Partition keys, read back as strings (e.g. a measure code that looks like a number stays a string)"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('economy', pa.string()), ('measure', pa.string())]), flavor='hive')
+
+def query(name, economies=None, measures=None, columns=None, filters=None):
+    """Read a source from the store, opening only the partitions of the given economies and measures
+
+    filters are further (column, operator, value) conditions, applied while the Parquet files are read.
+    The rows come back in the order of the source files, with the columns of the source.
+    """
+    version = ensure_source(name)
+
+    conditions = list(filters or [])
+    if economies is not None:
+        conditions.append(('economy', 'in', [str(economy) for economy in economies]))
+    if measures is not None:
+        conditions.append(('measure', 'in', [str(measure) for measure in measures]))
+
+    df = pd.read_parquet(source_dir(name, version), partitioning=partitioning(),
+                         columns=None if columns is None else list(columns) + ['_row'],
+                         filters=conditions or None)
+
+    df = df.sort_values('_row', kind='stable').drop(columns=['_row', 'economy', 'measure'], errors='ignore')
+    return df.reset_index(drop=True)
@@ -0,0 +1,22 @@
+import gc
+import os
+
+# gunicorn settings for the Procfile (gunicorn --config gunicorn.conf.py app:server)
+# The app is imported once in the master process, which also loads the data and builds the figures before
+# forking the workers. The workers then start in milliseconds and share that memory (copy-on-write) instead
+# of each importing the modules and loading the data again. The number of workers is set by WEB_CONCURRENCY.
+preload_app = True
+
+# Each worker serves requests on several threads, so a long download from /export streams on one thread while
+# the others keep answering (set by GUNICORN_THREADS)
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+def when_ready(server):
+    """Load the data in the master process, before the workers are forked"""
+    import app
+    app.warm_up()
+
+    # Move the loaded objects out of the garbage collector's generations, so collections in the workers
+    # do not write to (and so copy) the memory pages holding them
+    gc.freeze()
+    server.log.info('Data loaded, starting the workers')
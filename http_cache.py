@@ -0,0 +1,172 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import g, request, send_file
+from werkzeug.security import safe_join
+
+# HTTP caching of the app, so browsers and a reverse proxy in front of the app can answer repeat views with 304s:
+# - GET endpoints whose response only depends on the data, the code and the URL (the Dash layout and the exports) get
+#   an ETag made from the versions of the data and code and the URL, so a request sending it back in If-None-Match
+#   is answered with a 304 before the view runs.
+# - Pages and other GET responses get an ETag of their content and are revalidated by the browser.
+# - Assets are served from their precompressed .br/.gz copies when the browser accepts them, and with immutable
+#   cache headers when requested with their content hash (see asset_url).
+# Callbacks are POST requests, which are never answered with a 304 (and the Dash renderer does not revalidate them).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(BASE_DIR, 'assets')
+ASSETS_URL = '/assets/'
+
+# Asset types worth compressing (images such as .png and .webp, and .xlsx workbooks, are compressed already)
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.csv', '.txt', '.html', '.xls', '.pdf'}
+
+# Precompressed copies, in order of preference: (Content-Encoding, file extension)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Assets requested with their content hash are cached by browsers for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+# Folders with the code of the app (relative to BASE_DIR); only their own .py files are hashed, so a virtualenv or
+# any other folder in the checkout never counts towards the code version
+CODE_DIRS = ['', 'population_pyramid', 'sectoral_value_added_bar_chart_race']
+
+# GET endpoints answered from their version ETag (see version_etag)
+VERSIONED_PATHS = {'/_dash-layout', '/_dash-dependencies', '/export', '/export/images'}
+
+def code_version():
+    """Content hash of the Python files of the app in CODE_DIRS (including the population pyramid and the bar chart
+    race), so a deployment of new code never matches the ETags of the old one on any instance"""
+    digest = hashlib.sha256()
+    for code_dir in CODE_DIRS:
+        for name in sorted(os.listdir(os.path.join(BASE_DIR, code_dir))):
+            path = os.path.join(BASE_DIR, code_dir, name)
+            if name.endswith('.py') and os.path.isfile(path):
+                digest.update(os.path.relpath(path, BASE_DIR).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()[:16]
+
+CODE_VERSION = code_version()
+
+# Content hash of each asset: path -> (file version, hash)
+_asset_hashes = {}
+
+def asset_hash(path):
+    """Short content hash of an asset (path relative to the assets folder), recomputed when the file changes"""
+    full_path = os.path.join(ASSETS_DIR, path)
+    version = file_version(full_path)
+    if _asset_hashes.get(path, (None,))[0] != version:
+        with open(full_path, 'rb') as f:
+            _asset_hashes[path] = (version, hashlib.sha256(f.read()).hexdigest()[:12])
+    return _asset_hashes[path][1]
+
+def asset_url(path):
+    """URL of an asset with its content hash, e.g. /assets/flags/hk.png?v=3f2a9c1b0d4e"""
+    return f'{ASSETS_URL}{path}?v={asset_hash(path)}'
+
+def compress_assets():
+    """Write the .gz (and .br, with the brotli package) copies of the compressible assets that are missing or old
+
+    Returns the number of files written.
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = 0
+    for root, _, files in os.walk(ASSETS_DIR):
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            for encoding, extension in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                compressed_path = path + extension
+                if os.path.exists(compressed_path) and os.path.getmtime(compressed_path) >= os.path.getmtime(path):
+                    continue
+
+                with open(path, 'rb') as f:
+                    data = f.read()
+                data = brotli.compress(data) if encoding == 'br' else gzip.compress(data, compresslevel=9, mtime=0)
+
+                # Written to a temporary file first, so a request never gets a partial file
+                with open(compressed_path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(compressed_path + '.tmp', compressed_path)
+                written += 1
+    return written
+
+def serve_asset(path):
+    """Response for an asset, from a precompressed copy the browser accepts if there is an up-to-date one"""
+    full_path = safe_join(ASSETS_DIR, path)
+    if full_path is None or not os.path.isfile(full_path):
+        return None
+
+    file_path, encoding = full_path, None
+    for candidate, extension in ENCODINGS:
+        compressed_path = full_path + extension
+        if (candidate in request.accept_encodings and os.path.exists(compressed_path)
+                and os.path.getmtime(compressed_path) >= os.path.getmtime(full_path)):
+            file_path, encoding = compressed_path, candidate
+            break
+
+    # Only a URL with the current content hash can be cached for good; other URLs are revalidated (no-cache)
+    immutable = request.args.get('v') == asset_hash(path)
+
+    # Each encoding is a different representation of the asset, with its own ETag
+    response = send_file(file_path, mimetype=mimetypes.guess_type(full_path)[0] or 'application/octet-stream',
+                         conditional=True, etag=f'{asset_hash(path)}-{encoding or "identity"}',
+                         max_age=IMMUTABLE_MAX_AGE if immutable else None)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+def version_etag(data_version):
+    """ETag of a GET request to a versioned path: the same data, code and URL always give the same response"""
+    digest = hashlib.sha1(f'{data_version}|{CODE_VERSION}|{request.full_path}'.encode('utf-8'))
+    return digest.hexdigest()
+
+def register(server, get_data_version):
+    """Add the HTTP caching to the Flask server; get_data_version returns the version of all data of the app"""
+    @server.before_request
+    def answer_from_cache():
+        if request.method != 'GET':
+            return None
+
+        if request.path.startswith(ASSETS_URL):
+            return serve_asset(request.path[len(ASSETS_URL):])
+
+        if request.path in VERSIONED_PATHS:
+            g.version_etag = version_etag(get_data_version())
+            if g.version_etag in request.if_none_match:
+                response = server.response_class(status=304)
+                response.set_etag(g.version_etag)
+                return response
+
+    @server.after_request
+    def add_cache_headers(response):
+        if response.status_code != 200:
+            return response
+
+        # Versioned responses (streamed ones too) are revalidated with the ETag of their versions and URL
+        if 'version_etag' in g:
+            response.set_etag(g.version_etag)
+            response.cache_control.no_cache = True
+        # Other GET responses without caching headers of their own (e.g. the pages) are revalidated with the ETag of
+        # their content
+        elif (request.method == 'GET' and not response.is_streamed and 'ETag' not in response.headers
+              and 'Cache-Control' not in response.headers):
+            response.add_etag()
+            response.cache_control.no_cache = True
+            response = response.make_conditional(request)
+        return response
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lazy_imports import lazy_import
+import local_cache
+import shared_cache
+
+# Imported on first use (see lazy_imports.py)
+plotly_json = lazy_import('plotly.io.json')
+
+# Static PNG/SVG images of the dashboard charts, for reports and social media, e.g.
+#   image_export.render_image(figure, 'png', version=version)
+# The images are rendered by Kaleido in a pool of long-lived processes. Each process starts its Kaleido (a headless
+# Chromium) when the pool starts and keeps it running, so an image costs tens of milliseconds instead of the second
+# it takes to start Kaleido. The images are cached by dataset version and figure hash (see shared_cache.py).
+
+# Number of rendering processes (each with its own Kaleido) of each worker of the app
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '2'))
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+# Largest image size accepted (in pixels, before scaling) and largest scale
+MAX_IMAGE_SIZE = 4000
+MAX_SCALE = 4
+
+# Cache timeout of the images (in seconds)
+TIMEOUT = 60 * 60
+
+# Rendering pool of this process, created on first use (a worker forked by gunicorn creates its own)
+_pool = {'executor': None, 'pid': None}
+
+def warm_renderer():
+    """Start Kaleido in a rendering process by rendering an empty image"""
+    import plotly.io as pio
+    pio.to_image({'data': [], 'layout': {}}, format='png', width=10, height=10)
+
+def render_figure(figure, fmt, width, height, scale):
+    """Render a figure (as JSON) in a rendering process"""
+    import plotly.io as pio
+    return pio.to_image(figure, format=fmt, width=width, height=height, scale=scale, validate=False)
+
+def render_pool():
+    if _pool['executor'] is None or _pool['pid'] != os.getpid():
+        # Spawned rather than forked, as the worker of the app may be running other threads
+        _pool['executor'] = ProcessPoolExecutor(RENDER_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=warm_renderer)
+        _pool['pid'] = os.getpid()
+        # Start all rendering processes now, rather than one by one as images are requested
+        for _ in range(RENDER_WORKERS):
+            _pool['executor'].submit(int)
+    return _pool['executor']
+
+def chart_figures(charts):
+    """Figures (as JSON) of the graphs in a tree of Dash components (or their JSON), in the order they are shown"""
+    figures = []
+    stack = [json.loads(plotly_json.to_json_plotly(charts))]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict) and 'props' in node:
+            if node.get('type') == 'Graph' and node['props'].get('figure'):
+                figures.append(node['props']['figure'])
+            else:
+                stack.append(node['props'].get('children'))
+    return figures
+
+def figure_title(figure):
+    """First line of the title of a figure, as plain text"""
+    title = figure.get('layout', {}).get('title', {})
+    text = title.get('text', '') if isinstance(title, dict) else str(title)
+    return re.sub(r'<[^>]+>', '', re.split(r'<br\s*/?>', text)[0]).strip()
+
+def render_image(figure, fmt, width=None, height=None, scale=1, version=''):
+    """Image of a figure, from the cache or rendered by the pool"""
+    figure_hash = hashlib.sha256(json.dumps(figure, sort_keys=True).encode('utf-8')).hexdigest()
+    key = shared_cache.make_key('image', version, figure_hash, fmt, width, height, scale)
+    return shared_cache.cached(key, lambda: render_pool().submit(render_figure, figure, fmt, width, height,
+                                                                 scale).result(),
+                               bytes, bytes, TIMEOUT, local=local_cache)
+
+def render_images(figures, fmt, width=None, height=None, scale=1, version=''):
+    """Images of several figures, rendered in parallel by the processes of the pool"""
+    with ThreadPoolExecutor(RENDER_WORKERS) as executor:
+        return list(executor.map(lambda figure: render_image(figure, fmt, width, height, scale, version), figures))
+
+def images_zip(figures, images, fmt):
+    """Zip file of images, named by their position and the title of their figure"""
+    buffer = io.BytesIO()
+    # PNG images are compressed already
+    compression = zipfile.ZIP_STORED if fmt == 'png' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for n, (figure, image) in enumerate(zip(figures, images), 1):
+            slug = re.sub(r'[^A-Za-z0-9]+', '-', figure_title(figure)).strip('-').lower() or 'chart'
+            archive.writestr(f'{n:02d}_{slug}.{fmt}', image)
+    return buffer.getvalue()
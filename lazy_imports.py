@@ -0,0 +1,19 @@
+import importlib.util
+import sys
+
+# Heavy modules (pandas, numpy, plotly.graph_objects) are only needed once a page or chart is built, so the app
+# imports them lazily and starts serving sooner. Under gunicorn --preload they are loaded in the master process
+# by app.warm_up() instead (see gunicorn.conf.py), before the workers are forked.
+
+def lazy_import(name):
+    """Return a module that is only imported when one of its attributes is first used"""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+# Bounded cache of this instance, e.g.
+#   local_cache.set(key, data, timeout=3600)
+#   local_cache.get(key)  # None when missing or expired
+# Two tiers of bytes: an LRU in the memory of each process, on top of a size-capped disk tier shared by the worker
+# processes of the instance (see shared_cache.py for the tier shared by all instances). The disk entries are
+# indexed in SQLite with their size, expiry, last access and hit count, and evicted when the tier is full.
+
+CACHE_DIR = 'cache-directory'
+INDEX_FILE = os.path.join(CACHE_DIR, 'index.sqlite')
+
+# Size limits of the tiers (in bytes of cached data)
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+DISK_MAX_BYTES = 512 * 1024 * 1024
+
+# Disk entries evicted first when the disk tier is full: 'lru' (least recently used) or 'lfu' (least frequently
+# used, then least recently used)
+DISK_EVICTION = os.environ.get('CACHE_EVICTION', 'lru')
+
+EVICTION_ORDER = {
+    'lru': 'last_access',
+    'lfu': 'hits, last_access'
+}
+
+# Hit, miss and eviction counts of each tier in this process
+stats = {
+    'memory': {'hits': 0, 'misses': 0, 'evictions': 0},
+    'disk': {'hits': 0, 'misses': 0, 'evictions': 0}
+}
+
+# Memory tier: key -> (expiry time, data), least recently used first
+_memory = OrderedDict()
+_memory_size = {'bytes': 0}
+_memory_lock = threading.Lock()
+
+def memory_get(key):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            memory_delete(key)
+            return None
+        _memory.move_to_end(key)
+        return entry[1]
+
+def memory_set(key, data, expires):
+    # Entries larger than the whole tier are only kept on disk
+    if len(data) > MEMORY_MAX_BYTES:
+        return
+    with _memory_lock:
+        memory_delete(key)
+        _memory[key] = (expires, data)
+        _memory_size['bytes'] += len(data)
+        while _memory_size['bytes'] > MEMORY_MAX_BYTES:
+            memory_delete(next(iter(_memory)))
+            stats['memory']['evictions'] += 1
+
+def memory_delete(key):
+    """Remove a key from the memory tier (the caller holds _memory_lock)"""
+    entry = _memory.pop(key, None)
+    if entry is not None:
+        _memory_size['bytes'] -= len(entry[1])
+
+def connect():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(INDEX_FILE, timeout=60)
+    conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, file TEXT, size INTEGER, expires REAL, '
+                 'last_access REAL, hits INTEGER)')
+    return closing(conn)
+
+def entry_file(key):
+    return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.entry'
+
+def remove_files(files):
+    for file in files:
+        try:
+            os.remove(os.path.join(CACHE_DIR, file))
+        except FileNotFoundError:
+            pass
+
+def disk_get(key):
+    """Data and expiry time of a key in the disk tier, or None"""
+    with connect() as conn:
+        row = conn.execute('SELECT file, expires FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        file, expires = row
+        try:
+            if expires <= time.time():
+                raise FileNotFoundError
+            with open(os.path.join(CACHE_DIR, file), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Expired, or evicted by another process since the index was read
+            with conn:
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            remove_files([file])
+            return None
+
+        with conn:
+            conn.execute('UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+    return data, expires
+
+def disk_set(key, data, expires):
+    if len(data) > DISK_MAX_BYTES:
+        return
+    file = entry_file(key)
+    path = os.path.join(CACHE_DIR, file)
+
+    with connect() as conn:
+        # Written to a temporary file first, so readers never see a partial entry
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO entries (key, file, size, expires, last_access, hits) '
+                         'VALUES (?, ?, ?, ?, ?, 0)', (key, file, len(data), expires, time.time()))
+        evict_disk(conn, key)
+
+def evict_disk(conn, new_key):
+    """Remove the expired entries, then the first entries in the eviction order until the tier fits its size limit
+
+    The entry just written (new_key) is never evicted, or it would always be the least frequently used one.
+    """
+    with conn:
+        now = time.time()
+        expired = conn.execute('SELECT key, file FROM entries WHERE expires <= ?', (now,)).fetchall()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries WHERE expires > ?', (now,)).fetchone()[0]
+
+        evicted = []
+        if total > DISK_MAX_BYTES:
+            for key, file, size in conn.execute('SELECT key, file, size FROM entries WHERE expires > ? AND key != ? '
+                                                f'ORDER BY {EVICTION_ORDER[DISK_EVICTION]}', (now, new_key)):
+                if total <= DISK_MAX_BYTES:
+                    break
+                evicted.append((key, file))
+                total -= size
+
+        conn.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key, _ in expired + evicted])
+    remove_files([file for _, file in expired + evicted])
+    stats['disk']['evictions'] += len(evicted)
+
+def get(key):
+    """Cached data of a key, from the memory tier or else from the disk tier, or None"""
+    data = memory_get(key)
+    if data is not None:
+        stats['memory']['hits'] += 1
+        return data
+    stats['memory']['misses'] += 1
+
+    entry = disk_get(key)
+    if entry is None:
+        stats['disk']['misses'] += 1
+        return None
+    stats['disk']['hits'] += 1
+
+    # Keep it in memory for the next requests of this process
+    data, expires = entry
+    memory_set(key, data, expires)
+    return data
+
+def set(key, data, timeout):
+    """Store data (bytes) in both tiers, expiring after timeout seconds"""
+    expires = time.time() + timeout
+    memory_set(key, data, expires)
+    disk_set(key, data, expires)
+
+def entries(prefix=''):
+    """Entries of the disk tier (and whether this process also has them in memory), most recently used first"""
+    with connect() as conn:
+        rows = conn.execute('SELECT key, size, expires, last_access, hits FROM entries WHERE substr(key, 1, ?) = ? '
+                            'ORDER BY last_access DESC', (len(prefix), prefix)).fetchall()
+    with _memory_lock:
+        in_memory = {key for key in _memory}
+    return [{'key': key, 'size': size, 'expires': expires, 'last_access': last_access, 'hits': hits,
+             'in_memory': key in in_memory}
+            for key, size, expires, last_access, hits in rows]
+
+def flush(prefix=''):
+    """Remove the entries whose keys start with prefix (all entries by default) from both tiers
+
+    Only the memory tier of this process is flushed; the other worker processes keep theirs until they expire.
+    Returns the number of disk entries removed.
+    """
+    with _memory_lock:
+        for key in [key for key in _memory if key.startswith(prefix)]:
+            memory_delete(key)
+
+    with connect() as conn:
+        with conn:
+            rows = conn.execute('SELECT key, file FROM entries WHERE substr(key, 1, ?) = ?',
+                                (len(prefix), prefix)).fetchall()
+            conn.executemany('DELETE FROM entries WHERE key = ?', [(key,) for key, _ in rows])
+    remove_files([file for _, file in rows])
+    return len(rows)
+
+def cache_stats():
+    """Counts, sizes and limits of both tiers"""
+    with connect() as conn:
+        disk_entries, disk_bytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+    with _memory_lock:
+        memory_entries, memory_bytes = len(_memory), _memory_size['bytes']
+
+    return {
+        'memory': {**stats['memory'], 'entries': memory_entries, 'bytes': memory_bytes,
+                   'max_bytes': MEMORY_MAX_BYTES, 'eviction': 'lru'},
+        'disk': {**stats['disk'], 'entries': disk_entries, 'bytes': disk_bytes,
+                 'max_bytes': DISK_MAX_BYTES, 'eviction': DISK_EVICTION}
+    }
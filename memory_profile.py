@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Report the memory used by loading the data and building the charts, e.g.
+#   python memory_profile.py
+#   python memory_profile.py --scenario charts --top 20
+#   python memory_profile.py --save-baseline
+# Each scenario runs in a fresh interpreter (in an empty folder, so the local cache is cold) under tracemalloc.
+# Reported are the peak of the traced memory, the number of copies of the input data the peak amounts to, the memory
+# still held at the end with its largest allocation sites, and the peak RSS of the process. Without --save-baseline
+# the peaks are compared to memory_baseline.json, and the exit status is 1 when a scenario uses more than the
+# baseline plus the tolerance, or has no baseline (the baseline depends on the data files, so it is written on the
+# machine that runs the check, with --save-baseline).
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, 'memory_baseline.json')
+
+# Growth of the peak allowed over the baseline before a scenario fails
+TOLERANCE = 0.10
+
+# Economy of the chart scenarios, and the number of frames of the bar chart race rendered
+ECONOMY = 'Hong Kong'
+RACE_FRAMES = 20
+
+# Modules imported before tracing starts in every scenario, so their import does not count towards the scenarios
+PRELOAD = ['numpy', 'pandas', 'pyarrow.parquet']
+
+def frame_size(df):
+    return int(df.memory_usage(deep=True).sum())
+
+def scenario_load_data():
+    """app.load_data(): read the well-being data from the data store (and write it to the cache)"""
+    import app
+    with app.server.app_context():
+        df = app.load_data()
+    return frame_size(df)
+
+def scenario_charts():
+    """The charts of every domain of an economy, with and without the international comparison
+
+    These are the charts update_charts returns, built without its background prefetching of the next views.
+    """
+    import app
+    with app.server.app_context():
+        df = app.load_data()
+        yield frame_size(df)
+        for domain in df['Domain'].unique():
+            for comparison in ([], ['show']):
+                app.cached_charts(ECONOMY, domain, comparison)
+
+def scenario_comparison():
+    """app.create_international_comparison() of every domain"""
+    import app
+    with app.server.app_context():
+        df = app.load_data()
+        yield frame_size(df)
+        for domain in df['Domain'].unique():
+            app.create_international_comparison(ECONOMY, domain)
+
+def scenario_pyramid():
+    """The population pyramid of population_pyramid/pop_pyramid.py, up to the Vega-Lite spec of the chart"""
+    sys.path.insert(0, os.path.join(BASE_DIR, 'population_pyramid'))
+    import datastore
+    import pop_pyramid
+    df_population = datastore.query('population', economies=[ECONOMY])
+    yield frame_size(df_population)
+    df_raw_male = df_population[df_population['Sex'] == 'Male']
+    df_raw_female = df_population[df_population['Sex'] == 'Female']
+    pop_pyramid.create_pyramid_chart(pop_pyramid.pyramid_table(df_raw_male, df_raw_female), ECONOMY).to_dict()
+
+def scenario_race():
+    """The bar chart race of sectoral_value_added_bar_chart_race/animated.py: its data and the first frames"""
+    race_dir = os.path.join(BASE_DIR, 'sectoral_value_added_bar_chart_race')
+    sys.path.insert(0, race_dir)
+    # The emoji images are read from the folder of the script
+    os.chdir(race_dir)
+    import animated
+    yield frame_size(animated.df_raw)
+    animated.render_frames(0, min(RACE_FRAMES, animated.n_frames))
+
+# Modules of the dashboard (app.py and its requirements)
+APP_MODULES = ['plotly.graph_objects', 'dash', 'app']
+
+# Scenarios: (function, data store sources read, other modules imported before tracing starts)
+# The population pyramid and the bar chart race are standalone scripts, whose libraries (altair, matplotlib) are not
+# in requirements.txt; their scenarios are skipped where those are not installed.
+SCENARIOS = {
+    'load_data': (scenario_load_data, ['well_being'], APP_MODULES),
+    'charts': (scenario_charts, ['well_being'], APP_MODULES),
+    'comparison': (scenario_comparison, ['well_being'], APP_MODULES),
+    'pyramid': (scenario_pyramid, ['population'], ['altair']),
+    'race': (scenario_race, ['sector_value_added'], ['matplotlib.pyplot'])
+}
+
+def missing_modules(name):
+    """Modules of a scenario that are not installed"""
+    import importlib.util
+    return [module for module in SCENARIOS[name][2] if importlib.util.find_spec(module.split('.')[0]) is None]
+
+def run_scenario(name, top):
+    """Run a scenario under tracemalloc in this process and return its measurements
+
+    A scenario either returns the size of its input data, or yields it once the input is read and then goes on.
+    """
+    import importlib
+    import resource
+    import tracemalloc
+    sys.path.insert(0, BASE_DIR)
+    import datastore
+
+    function, sources, modules = SCENARIOS[name]
+    for module in PRELOAD + modules:
+        importlib.import_module(module)
+    # Parse the source files into the data store beforehand, as a running app only reads the store
+    for source in sources:
+        datastore.ensure_source(source)
+
+    tracemalloc.start(25)
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+
+    result = function()
+    if isinstance(result, int):
+        input_size = result
+    else:
+        input_size = next(result)
+        for _ in result:
+            pass
+
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    # Sites of the memory still held at the end (the peak itself cannot be snapshotted), leaving out the modules
+    # imported on first use, which count towards the peak but are not allocated by the code of the scenario
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib.*>')]
+    sites = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+    return {
+        'peak': peak,
+        'retained': current,
+        'input': input_size,
+        'copies': peak / input_size if input_size else None,
+        'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'sites': [(str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                  for stat in sites if stat.size_diff > 0][:top]
+    }
+
+def measure(name, top):
+    """Run a scenario in a fresh interpreter, in an empty working folder"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', name, '--top', str(top)],
+                                cwd=work_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'Scenario {name} failed:\n{result.stderr}')
+    # The measurements are the last line printed
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def megabytes(size):
+    return f'{size / 2 ** 20:8.1f} MB' if size >= 2 ** 20 else f'{size / 2 ** 10:8.1f} KB'
+
+def load_baseline():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the memory used by loading the data and building the charts')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='Scenario to run (can be repeated; default: all)')
+    parser.add_argument('--top', type=int, default=10, help='Number of allocation sites listed per scenario')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='Growth of the peak allowed over the baseline (default: 0.10, i.e. 10%%)')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Write the peaks to {BASELINE_FILE}')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_scenario(args.run, args.top)))
+        sys.exit(0)
+
+    baseline = load_baseline()
+    results, failed, no_baseline = {}, [], []
+    for name in args.scenario or list(SCENARIOS):
+        missing = missing_modules(name)
+        if missing:
+            print(f"{name}: skipped, {', '.join(missing)} not installed\n")
+            continue
+        results[name] = result = measure(name, args.top)
+        copies = f"{result['copies']:.1f}" if result['copies'] is not None else '-'
+        print(f"{name}: peak {megabytes(result['peak']).strip()}, retained {megabytes(result['retained']).strip()}, "
+              f"input {megabytes(result['input']).strip()} ({copies} copies at the peak), "
+              f"peak RSS {megabytes(result['rss']).strip()}")
+
+        if name in baseline and not args.save_baseline:
+            limit = baseline[name]['peak'] * (1 + args.tolerance)
+            change = result['peak'] / baseline[name]['peak'] - 1
+            status = 'FAIL' if result['peak'] > limit else 'ok'
+            print(f"  {status}: {change:+.1%} against the baseline of {megabytes(baseline[name]['peak']).strip()}")
+            if result['peak'] > limit:
+                failed.append(name)
+        elif not args.save_baseline:
+            print(f'  FAIL: no baseline of this scenario in {BASELINE_FILE}')
+            no_baseline.append(name)
+
+        print('  Largest allocation sites still held at the end:')
+        for site, size, count in result['sites']:
+            print(f'  {megabytes(size)} {count:8d} blocks  {site}')
+        print()
+
+    if args.save_baseline:
+        # Scenarios not run keep their old baseline
+        baseline.update({name: {'peak': result['peak'], 'rss': result['rss']} for name, result in results.items()})
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f'Baseline written to {BASELINE_FILE}')
+    elif failed or no_baseline:
+        if failed:
+            print(f"Memory grew beyond the baseline in: {', '.join(failed)}")
+        if no_baseline:
+            print(f"No baseline to compare to for: {', '.join(no_baseline)} (write one with --save-baseline)")
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import textwrap
+from dash import dcc, html, callback, Input, Output
+from lazy_imports import lazy_import
+import datastore
+
+# Imported on first use (see lazy_imports.py)
+np = lazy_import('numpy')
+go = lazy_import('plotly.graph_objects')
+
+# Well-being source in the local data store (its file is set in datastore.py)
+WELL_BEING_SOURCE = 'well_being'
+
+# Scores the economies can be coloured by: (key of the matrix, label, colour range)
+METRICS = {
+    'zscore': ('zscores', 'Z-score', {'zmid': 0}),
+    'percentile': ('percentiles', 'Percentile rank', {'zmin': 0, 'zmax': 100})
+}
+
+def build_overview_matrix(df):
+    """Arrange the totals into dense (economy x measure) arrays of the latest value of each measure, its year,
+    and its z-score and percentile rank among the economies"""
+    latest = (df.dropna(subset=['OBS_VALUE'])
+                .sort_values('TIME_PERIOD', kind='stable')
+                .drop_duplicates(['Reference area', 'MEASURE'], keep='last'))
+
+    # A single pivot for all measures, with the latest values and their years side by side
+    wide = latest.pivot(index='Reference area', columns='MEASURE', values=['OBS_VALUE', 'TIME_PERIOD'])
+    values = wide['OBS_VALUE'].to_numpy(dtype=float)
+    years = wide['TIME_PERIOD'].to_numpy(dtype=float)
+    missing = np.isnan(values)
+
+    # Scores of each economy among the economies with a value of the measure (column)
+    std = np.nanstd(values, axis=0)
+    zscores = np.divide(values - np.nanmean(values, axis=0), std, out=np.zeros_like(values), where=std > 0)
+    zscores[missing] = np.nan
+    percentiles = wide['OBS_VALUE'].rank(pct=True).to_numpy(dtype=float) * 100
+
+    measure_codes = wide['OBS_VALUE'].columns
+    details = df.drop_duplicates('MEASURE').set_index('MEASURE').reindex(measure_codes)
+    labels = details['Name'] if 'Name' in details.columns else details['Measure']
+
+    return {
+        'economies': wide.index.to_numpy(),
+        'measures': measure_codes.to_numpy(),
+        'labels': labels.to_numpy(),
+        'units': details['Unit of measure'].to_numpy(),
+        'domains': details['Domain'].to_numpy(),
+        'values': values,
+        'years': years,
+        'zscores': zscores,
+        'percentiles': percentiles
+    }
+
+def load_overview_matrix():
+    """Read the totals (no age, sex or education breakdown) and arrange them into the overview arrays"""
+    df = datastore.query(WELL_BEING_SOURCE, filters=[('AGE', '=', '_T'), ('SEX', '=', '_T'),
+                                                      ('EDUCATION_LEV', '=', '_T')])
+    return build_overview_matrix(df)
+
+def get_overview_matrix():
+    """Return the (economy x measure) overview arrays, rebuilt only when the dataset has changed"""
+    return datastore.derived(WELL_BEING_SOURCE, 'overview_matrix', load_overview_matrix)
+
+def create_overview_figure(matrix, domain=None, metric='zscore'):
+    """Create the heatmap of the economies and the measures of a domain (all measures without a domain)"""
+    key, metric_label, color_range = METRICS[metric]
+
+    # Slices of the arrays: the measures of the domain, and the economies with a value of any of them
+    columns = np.flatnonzero(matrix['domains'] == domain) if domain else np.arange(len(matrix['measures']))
+    rows = np.flatnonzero(~np.isnan(matrix['values'][:, columns]).all(axis=1))
+    cells = np.ix_(rows, columns)
+
+    fig = go.Figure(go.Heatmap(
+        z=matrix[key][cells],
+        x=['<br>'.join(textwrap.wrap(label, 20)) for label in matrix['labels'][columns]],
+        y=matrix['economies'][rows],
+        customdata=np.stack([matrix['values'][cells], matrix['years'][cells]], axis=-1),
+        colorscale='RdBu',
+        colorbar=dict(title=metric_label),
+        xgap=1,
+        ygap=1,
+        hoverongaps=False,
+        hovertemplate=
+        '<b>%{y}</b><br>' +
+        '%{x}<br>' +
+        'Latest value: %{customdata[0]:.2f} (%{customdata[1]})<br>' +
+        metric_label + ': %{z:.2f}' +
+        '<extra></extra>',
+        **color_range
+    ))
+
+    fig.update_layout(
+        title={
+            'text': f"<b>{domain or 'All domains'}</b>: latest values compared across economies ({metric_label})",
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'family': 'Arial'}
+        },
+        xaxis=dict(side='top', tickangle=0),
+        yaxis=dict(autorange='reversed'),
+        margin=dict(l=150, r=30, t=160, b=30),
+        height=max(450, 200 + 22 * len(rows)),
+        font={'family': 'Arial'}
+    )
+
+    return fig
+
+def layout():
+    """Layout of the overview page"""
+    matrix = get_overview_matrix()
+    domains = sorted(set(matrix['domains']))
+
+    return html.Div([
+        html.H1("Well-being Overview"),
+        html.Div([
+            html.Div([
+                html.Label("Select Welfare Domain:", className="dropdown-label"),
+                dcc.Dropdown(
+                    id='overview-domain',
+                    options=[{'label': domain, 'value': domain} for domain in domains],
+                    value=domains[0] if domains else None,
+                    placeholder="All domains"
+                )
+            ], style={'width': '48%', 'display': 'inline-block'}),
+            html.Div([
+                html.Label("Colour by:", className="dropdown-label"),
+                dcc.RadioItems(
+                    id='overview-metric',
+                    options=[{'label': label, 'value': metric} for metric, (_, label, _) in METRICS.items()],
+                    value='zscore',
+                    inline=True
+                )
+            ], style={'width': '48%', 'display': 'inline-block', 'float': 'right'})
+        ], style={'marginBottom': '15px'}),
+        dcc.Graph(id='overview-heatmap', config={'displayModeBar': False}),
+        html.Div([
+            html.P("Each cell is the latest value of a measure for an economy, scored against the other economies "
+                   "with a value of that measure. The latest year may differ between economies."),
+            html.P("A higher score means a higher value, which is not always better (e.g. deaths from suicide).")
+        ], className="notes-section")
+    ], style={'maxWidth': '1200px', 'margin': '0 auto', 'padding': '20px'})
+
+@callback(
+    Output('overview-heatmap', 'figure'),
+    [Input('overview-domain', 'value'),
+     Input('overview-metric', 'value')]
+)
+def update_overview(domain, metric):
+    return create_overview_figure(get_overview_matrix(), domain, metric)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from population_parser import file_hash, parse_population_file
+from pop_pyramid import create_pyramid_chart, pyramid_table
+
+# Population pyramids of every economy found in a directory of population tables, e.g.
+#   python batch_pyramids.py ../assets/datasets --output-dir pyramids
+# Supported tables: C&SD Table 110-01001 (one file per sex) and the SingStat residents by age group and sex table.
+# The content hash of each input is kept in a manifest, so only the economies with new or changed inputs are rebuilt.
+
+# Manifest of the inputs (content hash and economy) and the pyramid written for each economy
+MANIFEST_FILE = 'manifest.json'
+
+def find_inputs(input_dir):
+    """Excel files in the input directory and its subdirectories, relative to it"""
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            # Skip the lock files Excel leaves next to open workbooks
+            if name.endswith('.xlsx') and not name.startswith('~$'):
+                paths.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return paths
+
+def load_manifest(path):
+    """Return the manifest of the last run, or an empty one"""
+    if not os.path.exists(path):
+        return {'inputs': {}, 'outputs': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path):
+    """Write the manifest atomically, so an interrupted run never leaves a partial file"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def cache_file(cache_dir, entry):
+    """Parquet cache of an input, named by its content hash (inputs of the same name in different subdirectories
+    have caches of their own)"""
+    return os.path.join(cache_dir, entry['hash'] + '.parquet')
+
+def remove_unused_caches(cache_dir, inputs):
+    """Remove the caches of inputs that have changed or gone"""
+    used = {os.path.basename(cache_file(cache_dir, entry)) for entry in inputs.values()}
+    for name in os.listdir(cache_dir):
+        if name not in used:
+            os.remove(os.path.join(cache_dir, name))
+
+def write_pyramid(economy, tables, output_dir):
+    """Write the pyramid of an economy from its tidy population tables and return the output file name"""
+    df = pd.concat(tables, ignore_index=True).drop_duplicates(['Year', 'Sex', 'Age'], keep='last')
+    chart = create_pyramid_chart(pyramid_table(df[df['Sex'] == 'Male'], df[df['Sex'] == 'Female']), economy)
+
+    filename = 'pop_pyramid_' + economy.lower().replace(' ', '_') + '.html'
+    chart.save(os.path.join(output_dir, filename))
+    return filename
+
+def run_batch(input_dir, output_dir='pyramids', workers=None, force=False):
+    """Write the pyramids of the economies in input_dir, skipping those whose inputs have not changed
+
+    Returns the economies whose pyramids were written.
+    """
+    cache_dir = os.path.join(output_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    manifest = {'inputs': {}, 'outputs': {}} if force else load_manifest(manifest_path)
+    previous = manifest['inputs']
+
+    # Hash every input; unchanged inputs keep the economy found in the last run without being opened
+    inputs = {}
+    for path in find_inputs(input_dir):
+        digest = file_hash(os.path.join(input_dir, path))
+        if path in previous and previous[path]['hash'] == digest:
+            inputs[path] = previous[path]
+        else:
+            inputs[path] = {'hash': digest, 'economy': None}
+    changed = [path for path in inputs if path not in previous or previous[path]['hash'] != inputs[path]['hash']]
+
+    tables = {}
+    with ProcessPoolExecutor(workers) as executor:
+        def parse(paths):
+            full_paths = [os.path.join(input_dir, path) for path in paths]
+            return zip(paths, executor.map(parse_population_file, full_paths,
+                                           [cache_file(cache_dir, inputs[path]) for path in paths]))
+
+        # Parse the new and changed inputs (files without a population table are remembered as such)
+        for path, parsed in parse(changed):
+            if parsed is not None:
+                inputs[path]['economy'], tables[path] = parsed
+
+        # Rebuild the economies with changed or removed inputs, and those whose pyramid is missing
+        economies = {entry['economy'] for entry in inputs.values() if entry['economy'] is not None}
+        stale = {inputs[path]['economy'] for path in changed}
+        stale |= {entry['economy'] for path, entry in previous.items() if path not in inputs or path in changed}
+        stale |= {economy for economy in economies
+                  if not os.path.isfile(os.path.join(output_dir, manifest['outputs'].get(economy, '')))}
+        stale &= economies
+
+        # The unchanged inputs of the rebuilt economies are needed as well
+        for path, parsed in parse([path for path in inputs if path not in tables and inputs[path]['economy'] in stale]):
+            tables[path] = parsed[1]
+
+        futures = {economy: executor.submit(write_pyramid, economy,
+                                            [tables[path] for path in inputs if inputs[path]['economy'] == economy],
+                                            output_dir)
+                   for economy in sorted(stale)}
+        outputs = {economy: future.result() for economy, future in futures.items()}
+
+    manifest = {
+        'inputs': inputs,
+        'outputs': {economy: outputs.get(economy, manifest['outputs'].get(economy)) for economy in sorted(economies)}
+    }
+    save_manifest(manifest, manifest_path)
+    remove_unused_caches(cache_dir, inputs)
+    return sorted(outputs)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the population pyramids of all economies in a directory')
+    parser.add_argument('input_dir', help='Directory of population tables (searched recursively)')
+    parser.add_argument('--output-dir', default='pyramids')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Rebuild every pyramid, ignoring the manifest')
+    args = parser.parse_args()
+
+    written = run_batch(args.input_dir, args.output_dir, args.workers, args.force)
+    for economy in written:
+        print(f'Written the population pyramid of {economy}')
+    if not written:
+        print('All population pyramids are up to date')
\ No newline at end of file
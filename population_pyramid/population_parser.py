@@ -0,0 +1,198 @@
+import hashlib
+import os
+import openpyxl
+import pandas as pd
+
+# Columns of the tidy population table
+COLUMNS = ['Year', 'Sex', 'Age', 'Population', 'Provisional']
+
+def find_header(path, max_rows=30):
+    """Locate the heading row of a Table 110-01001 file and the columns of the year, sex, age group and figures"""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows_above = []
+        for row_number, row in enumerate(wb.active.iter_rows(max_row=max_rows, values_only=True), start=1):
+            cells = [str(cell).strip() if cell is not None else '' for cell in row]
+            if 'Year' in cells and 'Age group' in cells:
+                columns = {'Year': cells.index('Year'), 'Age group': cells.index('Age group')}
+                columns['Sex'] = cells.index('Sex') if 'Sex' in cells else None
+                columns['Reference time-point'] = cells.index('Reference time-point') if 'Reference time-point' in cells else None
+                # The figures are in the column after the age group
+                columns['Population'] = columns['Age group'] + 1
+
+                # Figures may be given in thousands, e.g. "Number ('000)" above the heading row
+                unit = ' '.join(above[columns['Population']] for above in rows_above if len(above) > columns['Population'])
+                multiplier = 1000 if "'000" in unit else 1
+
+                return row_number, columns, multiplier
+            rows_above.append(cells)
+    finally:
+        wb.close()
+
+    raise ValueError(f"Could not find the 'Year' and 'Age group' headings in {path}")
+
+def iter_population_rows(path):
+    """Stream (Year, Sex, Age, Population, Provisional) rows from a Table 110-01001 file
+
+    Only the columns between the year and the figures are read.
+    """
+    header_row, columns, multiplier = find_header(path)
+    used = [column for column in columns.values() if column is not None]
+    first_col, last_col = min(used), max(used)
+    position = {name: (column - first_col if column is not None else None) for name, column in columns.items()}
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        year = sex = None
+        provisional = False
+        for row in wb.active.iter_rows(min_row=header_row + 1, min_col=first_col + 1, max_col=last_col + 1,
+                                       values_only=True):
+            age = row[position['Age group']]
+
+            # The figures end at the first row without an age group (followed by the notes)
+            if age is None or not str(age).strip():
+                if year is not None:
+                    break
+                continue
+
+            # A new year block starts where the year is given
+            year_cell = row[position['Year']]
+            if year_cell is not None and str(year_cell).strip():
+                year_text = str(year_cell).strip()
+                year = int(''.join(ch for ch in year_text if ch.isdigit()))
+                reference = str(row[position['Reference time-point']] or '') if position['Reference time-point'] is not None else ''
+                # Provisional figures are marked with 'p', e.g. 'Mid-year p'
+                provisional = year_text.endswith('p') or 'p' in reference.split()
+                if position['Sex'] is not None and row[position['Sex']]:
+                    sex = str(row[position['Sex']]).strip()
+
+            yield year, sex, str(age).strip(), float(row[position['Population']]) * multiplier, provisional
+    finally:
+        wb.close()
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of the content of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_population_table(path, cache_path=None):
+    """Return the tidy population table of a Table 110-01001 file, cached as Parquet next to it
+
+    The cache holds the SHA-256 of the Excel file it was parsed from, and the whole file is parsed again when
+    its content changes (the figures of any year may be revised, and the latest year is not always marked
+    provisional).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + '.parquet'
+
+    digest = file_hash(path).encode('ascii')
+    if os.path.exists(cache_path) and (pq.read_schema(cache_path).metadata or {}).get(b'source_sha256') == digest:
+        return pd.read_parquet(cache_path)
+
+    df = pd.DataFrame(list(iter_population_rows(path)), columns=COLUMNS)
+    df = df.astype({'Year': int, 'Population': float, 'Provisional': bool})
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b'source_sha256': digest})
+    # Written to a temporary file first, so a reader never gets a partial cache
+    temp_path = f'{cache_path}.tmp-{os.getpid()}'
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, cache_path)
+    return df
+
+# Titles of the supported population tables, and the economy each of them covers
+TABLE_TITLES = {
+    'Population by Sex and Age Group': 'Hong Kong',  # C&SD Table 110-01001
+    'Singapore Residents By Age Group, Ethnic Group And Sex': 'Singapore'  # SingStat M810011
+}
+
+# Age groups of the pyramid (as in Table 110-01001), youngest first
+AGE_GROUPS = ['0 - 4', '5 - 9', '10 - 14', '15 - 19', '20 - 24', '25 - 29', '30 - 34', '35 - 39', '40 - 44',
+              '45 - 49', '50 - 54', '55 - 59', '60 - 64', '65 - 69', '70 - 74', '75 - 79', '80 - 84', '≥85']
+
+def identify_population_table(path, max_rows=10):
+    """Return (economy, sheet name) of a supported population table, or None if the file holds none"""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            for row in ws.iter_rows(max_row=max_rows, max_col=1, values_only=True):
+                for title, economy in TABLE_TITLES.items():
+                    if row[0] is not None and title in str(row[0]):
+                        return economy, ws.title
+    finally:
+        wb.close()
+
+    return None
+
+def singstat_age_group(label):
+    """Map a SingStat age group (e.g. '  5 - 9 Years', '85 Years & Over') to the pyramid's age group, or None"""
+    label = str(label).strip()
+    if label == '85 Years & Over':
+        return '≥85'
+    if label.endswith(' Years') and label[:-len(' Years')] in AGE_GROUPS:
+        return label[:-len(' Years')]
+    return None
+
+def load_singstat_population(path, sheet):
+    """Return the tidy population table of the SingStat residents by age group and sex table
+
+    Only the years with figures for all age groups of both sexes are kept.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = []
+        years = sex = None
+        for row in wb[sheet].iter_rows(values_only=True):
+            label = str(row[0]).strip() if row[0] is not None else ''
+
+            if label == 'Data Series':
+                years = [int(year) for year in row[1:] if year is not None]
+            elif label in ('Total Male Residents', 'Total Female Residents'):
+                sex = label.split()[1]
+            elif label.startswith('Total'):
+                # The breakdowns by ethnic group follow the totals
+                if sex is not None:
+                    break
+            elif sex is not None and singstat_age_group(label) is not None:
+                for year, value in zip(years, row[1:]):
+                    # Figures not available are given as 'na'
+                    if isinstance(value, (int, float)):
+                        rows.append((year, sex, singstat_age_group(label), float(value), False))
+    finally:
+        wb.close()
+
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    complete = df.groupby('Year')['Age'].transform('size') == len(AGE_GROUPS) * 2
+    df = df[complete]
+
+    # Sort by year and age group, as in Table 110-01001
+    df = df.assign(AgeIndex=df['Age'].map(AGE_GROUPS.index))
+    df = df.sort_values(['Sex', 'Year', 'AgeIndex'], ascending=[False, True, True], ignore_index=True)
+    return df[COLUMNS]
+
+def parse_population_file(path, cache_path=None):
+    """Return (economy, tidy population table) of a supported population file, or None if it holds none
+
+    The Parquet cache of a Table 110-01001 file is kept at cache_path if given, otherwise next to it.
+    """
+    identified = identify_population_table(path)
+    if identified is None:
+        return None
+
+    economy, sheet = identified
+    if economy == 'Singapore':
+        return economy, load_singstat_population(path, sheet)
+
+    # Other downloads of Table 110-01001 (e.g. selected age groups across the years) are not supported
+    try:
+        find_header(path)
+    except ValueError:
+        return None
+
+    return economy, load_population_table(path, cache_path)
\ No newline at end of file
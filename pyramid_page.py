@@ -0,0 +1,186 @@
+from dash import dcc, html, clientside_callback, Input, Output, State
+from lazy_imports import lazy_import
+import datastore
+
+# Imported on first use (see lazy_imports.py)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+
+# Population source in the local data store (its files are set in datastore.py)
+POPULATION_SOURCE = 'population'
+
+def build_pyramid_array(tables):
+    """Arrange the tidy population tables into a contiguous (year x age group x sex) array"""
+    years = np.sort(pd.concat([table['Year'] for table in tables]).unique())
+    ages = tables[0]['Age'].drop_duplicates().tolist()  # Youngest age group first, as in the table
+
+    values = np.zeros((len(years), len(ages), len(tables)), dtype=np.float32)
+    for s, table in enumerate(tables):
+        year_index = np.searchsorted(years, table['Year'].to_numpy())
+        age_index = pd.Index(ages).get_indexer(table['Age'])
+        values[year_index, age_index, s] = table['Population'].to_numpy()
+
+    provisional = sorted(set().union(*[table.loc[table['Provisional'], 'Year'] for table in tables]))
+    return {'years': years, 'ages': ages, 'values': np.ascontiguousarray(values), 'provisional': provisional}
+
+def load_pyramid_data():
+    """Read the population of Hong Kong and arrange it into the pyramid array"""
+    df = datastore.query(POPULATION_SOURCE, economies=['Hong Kong'])
+    return build_pyramid_array([df[df['Sex'] == sex] for sex in ('Male', 'Female')])
+
+def get_pyramid_data():
+    """Return the (year x age group x sex) pyramid array, rebuilt only when the population tables have changed"""
+    return datastore.derived(POPULATION_SOURCE, 'pyramid_data', load_pyramid_data)
+
+def create_pyramid_figure(data, year_index):
+    """Create the pyramid for one year from a view of the array"""
+    year_values = data['values'][year_index]
+    year = int(data['years'][year_index])
+    max_value = data['values'].max()
+
+    # Round the axis to a multiple of 100,000
+    axis_max = np.ceil(max_value / 100000) * 100000
+    ticks = np.linspace(-axis_max, axis_max, 9)
+
+    fig = go.Figure([
+        go.Bar(
+            x=-year_values[:, 0],
+            y=data['ages'],
+            customdata=year_values[:, 0],
+            orientation='h',
+            name='Male',
+            marker=dict(color='cornflowerblue'),
+            hovertemplate='Male, %{y}: %{customdata:,.0f}<extra></extra>'
+        ),
+        go.Bar(
+            x=year_values[:, 1],
+            y=data['ages'],
+            orientation='h',
+            name='Female',
+            marker=dict(color='lightcoral'),
+            hovertemplate='Female, %{y}: %{x:,.0f}<extra></extra>'
+        )
+    ])
+
+    provisional_note = ' (provisional)' if year in data['provisional'] else ''
+    fig.update_layout(
+        title={
+            'text': f"<b>Population Pyramid of Hong Kong, {year}</b>{provisional_note}",
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'family': 'Arial'}
+        },
+        barmode='overlay',
+        bargap=0.1,
+        xaxis=dict(
+            title='Male Population | Female Population',
+            range=[-axis_max, axis_max],
+            tickvals=ticks,
+            ticktext=[f"{abs(int(tick)):,}" for tick in ticks],
+            titlefont={'family': 'Arial'}
+        ),
+        yaxis=dict(title='Age Group', titlefont={'family': 'Arial'}),
+        legend=dict(orientation='h', yanchor='top', y=-0.15, xanchor='center', x=0.5),
+        margin=dict(l=80, r=30, t=70, b=80),
+        height=600,
+        font={'family': 'Arial'}
+    )
+
+    return fig
+
+def create_totals_figure(data, year_index):
+    """Create the bar chart of total population, highlighting the selected year"""
+    totals = data['values'].sum(axis=(1, 2))
+    colors = ['lightgray'] * len(totals)
+    colors[year_index] = 'darkred'
+
+    fig = go.Figure(go.Bar(
+        x=data['years'],
+        y=totals,
+        marker=dict(color=colors),
+        hovertemplate='%{x}: %{y:,.0f}<extra></extra>'
+    ))
+    fig.update_layout(
+        xaxis=dict(title='Year', titlefont={'family': 'Arial'}),
+        yaxis=dict(title='Total Population', titlefont={'family': 'Arial'}),
+        margin=dict(l=80, r=30, t=20, b=50),
+        height=300,
+        font={'family': 'Arial'}
+    )
+
+    return fig
+
+def layout():
+    """Layout of the population pyramid page"""
+    data = get_pyramid_data()
+    years = data['years']
+    latest = len(years) - 1
+
+    return html.Div([
+        html.H1("Population Pyramid of Hong Kong"),
+        # The whole array is sent once; the slider is then handled in the browser
+        dcc.Store(id='pyramid-data', data={
+            'years': years.tolist(),
+            'male': data['values'][:, :, 0].tolist(),
+            'female': data['values'][:, :, 1].tolist(),
+            'provisional': data['provisional']
+        }),
+        dcc.Graph(id='pyramid-chart', figure=create_pyramid_figure(data, latest), config={'displayModeBar': False}),
+        html.Div([
+            dcc.Slider(
+                id='pyramid-year',
+                min=int(years[0]),
+                max=int(years[-1]),
+                step=1,
+                value=int(years[-1]),
+                marks={int(year): str(year) for year in years if year % 10 == 0},
+                tooltip={'placement': 'bottom', 'always_visible': True}
+            )
+        ], style={'padding': '0 40px'}),
+        dcc.Graph(id='pyramid-totals', figure=create_totals_figure(data, latest), config={'displayModeBar': False}),
+        html.Div([
+            html.P("Data source: Census and Statistics Department, Table 110-01001."),
+            html.P("The figures from 1961 to 1995 are compiled based on the \"extended de facto\" method and those "
+                   "from 1996 onwards are compiled based on the \"resident population\" method.")
+        ], className="notes-section")
+    ], style={'maxWidth': '1200px', 'margin': '0 auto', 'padding': '20px'})
+
+# Update both charts in the browser when the slider moves (no request to the server)
+clientside_callback(
+    """
+    function(year, data, pyramid, totals) {
+        var i = data.years.indexOf(year);
+        if (i < 0 || !pyramid || !totals) {
+            return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+        }
+        var male = data.male[i];
+        var note = data.provisional.indexOf(year) >= 0 ? ' (provisional)' : '';
+
+        var newPyramid = Object.assign({}, pyramid, {
+            data: [
+                Object.assign({}, pyramid.data[0], {x: male.map(function (v) { return -v; }), customdata: male}),
+                Object.assign({}, pyramid.data[1], {x: data.female[i]})
+            ],
+            layout: Object.assign({}, pyramid.layout, {
+                title: Object.assign({}, pyramid.layout.title, {
+                    text: '<b>Population Pyramid of Hong Kong, ' + year + '</b>' + note
+                })
+            })
+        });
+
+        var colors = data.years.map(function (y) { return y === year ? 'darkred' : 'lightgray'; });
+        var newTotals = Object.assign({}, totals, {
+            data: [Object.assign({}, totals.data[0], {marker: {color: colors}})]
+        });
+
+        return [newPyramid, newTotals];
+    }
+    """,
+    [Output('pyramid-chart', 'figure'),
+     Output('pyramid-totals', 'figure')],
+    [Input('pyramid-year', 'value')],
+    [State('pyramid-data', 'data'),
+     State('pyramid-chart', 'figure'),
+     State('pyramid-totals', 'figure')]
+)
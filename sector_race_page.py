@@ -0,0 +1,147 @@
+import plotly.colors
+from dash import dcc, html
+from lazy_imports import lazy_import
+import datastore
+from sectoral_value_added_bar_chart_race.race_engine import frame_count, iter_frames
+from sectoral_value_added_bar_chart_race.sector_data import labels
+
+# Imported on first use (see lazy_imports.py)
+np = lazy_import('numpy')
+go = lazy_import('plotly.graph_objects')
+
+# Value added source in the local data store (its file is set in datastore.py)
+SECTOR_SOURCE = 'sector_value_added'
+
+# Frames per year; the browser animates smoothly between frames, so few are needed
+RACE_STEPS = 2
+
+# Time between frames (in milliseconds)
+RACE_INTERVAL = 300
+
+# One colour per sector
+sector_colors = (plotly.colors.qualitative.Light24 * 2)[:len(labels)]
+
+def load_sector_values():
+    """Read the value added from the data store, with one row per year and one column per sector"""
+    df = datastore.query(SECTOR_SOURCE, columns=['Year', 'Sector', 'Value'])
+    # Keep the sectors in the column order of the table (the order of the labels)
+    return df.pivot(index='Year', columns='Sector', values='Value')[df['Sector'].unique()]
+
+def build_race_frames(df_raw, steps=RACE_STEPS):
+    """Interpolate the (year x sector) table into compact per-frame arrays"""
+    years = df_raw.index.to_numpy()
+    n_frames = frame_count(years, steps)
+
+    frame_years = np.empty(n_frames, dtype=int)
+    values = np.empty((n_frames, len(labels)), dtype=np.float32)
+    ranks = np.empty((n_frames, len(labels)), dtype=np.float32)
+
+    for i, (year, frame_values, frame_ranks) in enumerate(iter_frames(df_raw.to_numpy(dtype=float), years, steps)):
+        frame_years[i] = year
+        values[i] = frame_values
+        ranks[i] = frame_ranks
+
+    return frame_years, values, ranks
+
+def build_race_figure(frame_years, values, ranks):
+    """Build a Plotly animation that only carries the bar widths, positions and shares in each frame"""
+    totals = values.sum(axis=1)
+    shares = values / totals[:, np.newaxis] * 100
+
+    # Round the arrays to keep the data sent to the browser small
+    values = np.round(values).astype(int)
+    ranks = np.round(ranks, 2)
+    shares = np.round(shares, 1)
+
+    frames = []
+    for i in range(len(frame_years)):
+        frames.append(go.Frame(
+            name=str(i),
+            data=[go.Bar(x=values[i], y=ranks[i], customdata=shares[i])],
+            layout=dict(
+                xaxis=dict(range=[0, values[i].max() * 1.5]),
+                annotations=[dict(
+                    text=f"<b>{frame_years[i]}</b><br>Total Nominal GDP: HK${int(totals[i]):,} million",
+                    x=0.98, y=0.05, xref='paper', yref='paper', xanchor='right', yanchor='bottom',
+                    showarrow=False, align='right', font={'size': 16}
+                )]
+            )
+        ))
+
+    # The sector names and colours are sent once in the base trace
+    fig = go.Figure(
+        data=[go.Bar(
+            x=values[0],
+            y=ranks[0],
+            customdata=shares[0],
+            orientation='h',
+            text=labels,
+            texttemplate='%{text}: %{x:,} (%{customdata:.1f}%)',
+            textposition='outside',
+            cliponaxis=False,
+            marker=dict(color=sector_colors),
+            hovertemplate='<b>%{text}</b><br>HK$%{x:,} million (%{customdata:.1f}%)<extra></extra>'
+        )],
+        layout=frames[0].layout,
+        frames=frames
+    )
+
+    # One slider step per year (the first frame of each year)
+    year_starts = np.flatnonzero(np.r_[True, frame_years[1:] != frame_years[:-1]])
+    frame_args = lambda duration: dict(frame=dict(duration=duration, redraw=True),
+                                       transition=dict(duration=duration, easing='linear'), mode='immediate')
+
+    fig.update_layout(
+        title={
+            'text': '<b>Evolving Economic Landscape of Hong Kong</b><br>'
+                    f'Nominal Value Added at Basic Price by Sector ({frame_years[0]} – {frame_years[-1]})',
+            'x': 0.5,
+            'xanchor': 'center',
+            'font': {'family': 'Arial'}
+        },
+        xaxis=dict(title='(HK$ million)', tickformat=',', titlefont={'family': 'Arial'}),
+        yaxis=dict(showticklabels=False, range=[0.4, len(labels) + 0.6]),
+        height=700,
+        margin=dict(l=30, r=30, t=90, b=120),
+        font={'family': 'Arial'},
+        plot_bgcolor='#e5e5e5',
+        updatemenus=[dict(
+            type='buttons',
+            direction='left',
+            x=0.0, y=-0.12, xanchor='left', yanchor='top',
+            buttons=[
+                dict(label='Play', method='animate', args=[None, dict(frame_args(RACE_INTERVAL), fromcurrent=True)]),
+                dict(label='Pause', method='animate', args=[[None], frame_args(0)])
+            ]
+        )],
+        sliders=[dict(
+            x=0.12, y=-0.08, len=0.88,
+            currentvalue=dict(prefix='Year: '),
+            steps=[dict(label=str(frame_years[i]), method='animate', args=[[str(i)], frame_args(0)])
+                   for i in year_starts]
+        )]
+    )
+
+    return fig
+
+def load_race_figure():
+    """Read the value added and build the race figure from its compact frame arrays"""
+    frame_years, values, ranks = build_race_frames(load_sector_values())
+    return build_race_figure(frame_years, values, ranks)
+
+def get_race_figure():
+    """Return the race figure, rebuilt only when the data file has changed"""
+    return datastore.derived(SECTOR_SOURCE, 'race_figure', load_race_figure)
+
+def layout():
+    """Layout of the sector value added race page"""
+    return html.Div([
+        html.H1("Sector Value Added Race"),
+        dcc.Graph(figure=get_race_figure(), config={'displayModeBar': False}),
+        html.Div([
+            html.P("Data source: Census and Statistics Department, Table 310-34101."),
+            html.P("Industry classification for figures from 1980 to 1999 is different from that for figures from 2000 onwards. "
+                   "Manual adjustment has therefore been applied to some sectoral figures during 1980 - 1999 to align the two "
+                   "sets of industry classification as far as practicable.")
+        ], className="notes-section")
+    ], style={'maxWidth': '1200px', 'margin': '0 auto', 'padding': '20px'})
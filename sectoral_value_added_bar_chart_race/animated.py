@@ -1,19 +1,53 @@
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+from race_engine import frame_count, iter_frames
+from race_output import save_output
+from sector_data import labels
 
-# Allow sufficient space for rendering animation
-plt.rcParams['animation.embed_limit'] = 50
+# The data store is in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import datastore
 
-# Read in the dafa file
-df_raw=pd.read_excel("Table 310-34101.xlsx")
-df_raw['Wholesale, import & export trade']=df_raw['Wholesale']+df_raw['Import and export trade']
-df_raw['Warehousing, courier and other transportation services']=df_raw['Warehousing and other transportation services']+df_raw['Postal and courier services']
-df_raw.drop(columns=['Wholesale', 'Import and export trade', 'Warehousing and other transportation services', 'Postal and courier services'],inplace=True)
-df_raw.set_index('Year',inplace=True)
+# Rendering mode: 'reuse' creates the bars, texts and emoji images once and only updates them in each frame,
+# 'redraw' clears the axes and redraws everything in each frame
+RENDER_MODE = 'reuse'
+
+# Renderer: 'parallel' rasterises the frames in a pool of worker processes,
+# 'serial' renders them one after another in this process
+RENDERER = 'parallel'
+
+# Number of worker processes used by the parallel renderer
+WORKERS = os.cpu_count()
+
+# Output format:
+#   'frames' - a small HTML player that loads the frames from separate WebP files as they are needed
+#   'mp4'    - an H.264 video (needs ffmpeg)
+#   'webp'   - an animated WebP image
+#   'html'   - a single HTML player with all frames embedded
+#   'jshtml' - FuncAnimation.to_jshtml(), always rendered serially (tens of megabytes)
+OUTPUT_FORMAT = 'frames'
+
+# Folder for the frame files of the 'frames' output (relative to the HTML page)
+FRAMES_DIR = 'sector_va_frames'
+
+# Time between frames (in milliseconds)
+INTERVAL = 150
+
+# Number of frames between two years, and the easing of the movement between them ('linear', 'ease_in_out' or 'ease_out')
+STEPS = 5
+EASING = 'linear'
+
+# Read in the data from the data store (parsed from Table 310-34101.xlsx once per version of the file)
+df_sector=datastore.query('sector_value_added', columns=['Year', 'Sector', 'Value'])
+df_raw=df_sector.pivot(index='Year', columns='Sector', values='Value')[df_sector['Sector'].unique()]
 
 # Color map used
 colors = plt.cm.tab20(np.linspace(0, 1, 21))
@@ -26,41 +60,13 @@ def nice_axes(ax):
     ax.set_axisbelow(True)
     [spine.set_visible(False) for spine in ax.spines.values()]
 
-def prepare_data(df, steps=5):
-    df = df.reset_index()
-    df.index = df.index * steps
-    last_idx = df.index[-1] + 1
-    df_expanded = df.reindex(range(last_idx))
-    df_expanded['Year'] = df_expanded['Year'].fillna(method='ffill')
-    df_expanded = df_expanded.set_index('Year')
-    df_rank_expanded = df_expanded.rank(axis=1, method='first')
-    df_expanded = df_expanded.interpolate()
-    df_rank_expanded = df_rank_expanded.interpolate()
-    return df_expanded, df_rank_expanded
-
-df_expanded, df_rank_expanded = prepare_data(df_raw)
-
-labels=['Agriculture, fishing, mining & quarrying',
-        'Manufacturing',
-        'Electricity, gas & water supply',
-        'Construction',        
-        'Retail trade',
-        'Accommodation services',
-        'Food & beverage services',
-        'Land transport',
-        'Water transport',
-        'Air transport',
-        'Financing',
-        'Insurance',
-        'Real estate',
-        'Telecommunications',
-        'Other information & communications services',
-        'Professional & business services',
-        'Public administration',
-        'Social & personal services',
-        'Ownership of premises',
-        'Wholesale, import & export trade',
-        'Warehousing, courier & other transport services']
+# The frames are interpolated from these (year x sector) values as they are rendered
+years = df_raw.index.to_numpy()
+sector_values = df_raw.to_numpy(dtype=float)
+n_frames = frame_count(years, STEPS)
+
+# Load the emoji images once rather than in every frame
+emoji_images = [plt.imread(f'emoji_{n}.png') for n in range(1, len(labels) + 1)]  # Update path and naming convention as needed
 
 def init():
     ax.clear()
@@ -72,7 +78,7 @@ def init():
         'Evolving Economic Landscape of Hong Kong:\nNominal Value Added at Basic Price by Sector (1980 – 2022)',
         fontsize=10)
 
-def update(i):
+def update(frame):
     ax.clear()
     nice_axes(ax)
     ax.set_xlabel('(HK$ million)', fontsize=5)
@@ -81,8 +87,7 @@ def update(i):
     ax.set_title(
         'Evolving Economic Landscape of Hong Kong:\nNominal Value Added at Basic Price by Sector (1980 – 2023)',
         fontsize=10)
-    y = df_rank_expanded.iloc[i]
-    width = df_expanded.iloc[i]
+    year, width, y = frame
     total = width.sum()
     bars = ax.barh(y=y, width=width, color=colors, tick_label=labels)
     text_objects = []
@@ -96,8 +101,7 @@ def update(i):
         text_objects.append(text)
     
         # Load the corresponding emoji image for each label
-        emoji_path = f'emoji_{labels.index(label)+1}.png'  # Update path and naming convention as needed
-        emoji_img = plt.imread(emoji_path)
+        emoji_img = emoji_images[labels.index(label)]
         imagebox = OffsetImage(emoji_img, zoom=0.1)  # Adjust zoom to fit the size of your plot
 
         ab = AnnotationBbox(imagebox, (-20, bar.get_y() + bar.get_height() / 2), frameon=False, box_alignment=(1.25, 0.5))
@@ -106,17 +110,117 @@ def update(i):
     total_text = ax.text(0.95, 0.05, f'Total Nominal GDP: HK${format(int(total), ",")} million', transform=ax.transAxes,
                          horizontalalignment='right', verticalalignment='bottom', color='black', fontsize=10)    
     ax.get_xaxis().set_major_formatter(matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
-    year = df_expanded.index[i]
     ax.text(0.95, 0.125, f'{int(year)}', transform=ax.transAxes,
             horizontalalignment='right', verticalalignment='bottom', color='black', fontsize=12)
-    
+
+# Artists created once by init_reuse() and updated by update_reuse()
+artists = {}
+
+def init_reuse():
+    ax.clear()
+    nice_axes(ax)
+    ax.set_xlabel('(HK$ million)', fontsize=5)
+    ax.tick_params(axis='x', labelsize=7)
+    ax.tick_params(axis='y', labelsize=5, which='major', pad=10)
+    ax.set_title(
+        'Evolving Economic Landscape of Hong Kong:\nNominal Value Added at Basic Price by Sector (1980 – 2023)',
+        fontsize=10)
+    ax.get_xaxis().set_major_formatter(matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
+
+    # Create the bars, value labels and emoji images once, at the positions of the first frame
+    _, width, y = next(iter_frames(sector_values, years, STEPS, EASING))
+    bars = ax.barh(y=y, width=width, color=colors, tick_label=labels)
+    value_texts = []
+    emoji_boxes = []
+    for bar, emoji_img in zip(bars, emoji_images):
+        y_pos = bar.get_y() + bar.get_height() / 2
+        value_texts.append(ax.text(bar.get_width() + 0.5, y_pos, '', va='center', fontsize=5))
+        ab = AnnotationBbox(OffsetImage(emoji_img, zoom=0.1), (-20, y_pos), frameon=False, box_alignment=(1.25, 0.5))
+        ax.add_artist(ab)
+        emoji_boxes.append(ab)
+
+    total_text = ax.text(0.95, 0.05, '', transform=ax.transAxes,
+                         horizontalalignment='right', verticalalignment='bottom', color='black', fontsize=10)
+    year_text = ax.text(0.95, 0.125, '', transform=ax.transAxes,
+                        horizontalalignment='right', verticalalignment='bottom', color='black', fontsize=12)
+
+    artists.update(bars=bars, value_texts=value_texts, emoji_boxes=emoji_boxes,
+                   total_text=total_text, year_text=year_text)
+
+def update_reuse(frame):
+    year, width, y = frame
+    total = width.sum()
+
+    # Only move and resize the existing artists
+    for bar, text, ab, y_pos, width_size in zip(artists['bars'], artists['value_texts'], artists['emoji_boxes'], y, width):
+        bar.set_y(y_pos - bar.get_height() / 2)
+        bar.set_width(width_size)
+        share = (width_size / total) * 100  # Calculate the percentage share
+        text.set_position((width_size + 0.5, y_pos))
+        text.set_text(f"{format(int(width_size), ',')} ({share:.1f}%)")
+        ab.xy = ab.xybox = (-20, y_pos)
+    ax.set_yticks(y, labels)
+
+    artists['total_text'].set_text(f'Total Nominal GDP: HK${format(int(total), ",")} million')
+    artists['year_text'].set_text(f'{int(year)}')
+
+    # Rescale the x-axis to the new bar widths, as ax.barh() would on a cleared axes
+    ax.relim()
+    ax.autoscale_view()
+
 fig = plt.Figure(figsize=(8, 4), dpi=144)
 fig.subplots_adjust(left=0.25)
 ax = fig.add_subplot()
-anim = FuncAnimation(fig=fig, func=update, init_func=init, frames=len(df_expanded), 
-                     interval=150, repeat=False)
+FigureCanvasAgg(fig)  # Rasterise with the Agg backend
+
+def render_frames(start, stop):
+    """Render frames start to stop - 1 and return them as PNG images (run in each worker process)"""
+    if RENDER_MODE == 'reuse':
+        # Each worker process creates its own artists once
+        if not artists:
+            init_reuse()
+        draw_frame = update_reuse
+    else:
+        draw_frame = update
+
+    images = []
+    for frame in iter_frames(sector_values, years, STEPS, EASING, start, stop):
+        draw_frame(frame)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        images.append(buffer.getvalue())
+    return images
+
+def render_parallel(workers=WORKERS):
+    """Split the frames across worker processes and return the PNG images in frame order"""
+    # Use more chunks than workers so that all workers stay busy until the end
+    bounds = np.linspace(0, n_frames, workers * 4 + 1).astype(int)
+    starts, stops = bounds[:-1].tolist(), bounds[1:].tolist()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [image for images in executor.map(render_frames, starts, stops) for image in images]
+
+if __name__ == '__main__':
+    if OUTPUT_FORMAT != 'jshtml':
+        if RENDERER == 'parallel':
+            images = render_parallel()
+        else:
+            images = render_frames(0, n_frames)
+
+        save_output(images, OUTPUT_FORMAT, 'sector_va', 'Nominal Value Added by Sector', INTERVAL, FRAMES_DIR)
+    else:
+        # Allow sufficient space for rendering animation
+        plt.rcParams['animation.embed_limit'] = 50
+
+        # The frames are generated as they are drawn rather than stored
+        frames = lambda: iter_frames(sector_values, years, STEPS, EASING)
+        if RENDER_MODE == 'reuse':
+            anim = FuncAnimation(fig=fig, func=update_reuse, init_func=init_reuse, frames=frames, save_count=n_frames,
+                                 cache_frame_data=False, interval=INTERVAL, repeat=False)
+        else:
+            anim = FuncAnimation(fig=fig, func=update, init_func=init, frames=frames, save_count=n_frames,
+                                 cache_frame_data=False, interval=INTERVAL, repeat=False)
 
-# Write the content to an html file
-html_content = anim.to_jshtml()
-with open('sector_va.html', 'w') as f:
-    f.write(html_content)
\ No newline at end of file
+        # Write the content to an html file
+        html_content = anim.to_jshtml()
+        with open('sector_va.html', 'w') as f:
+            f.write(html_content)
\ No newline at end of file
@@ -0,0 +1,113 @@
+import argparse
+import io
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from race_engine import iter_frames, table_to_matrix, visible_entities
+from race_output import save_output
+
+# Bar chart race for any (entity, time, value) table, e.g.
+#   python generic_race.py well_being_data.xlsx --where MEASURE=LIFE_EXP --where SEX=_T --where AGE=_T
+#       --where EDUCATION_LEV=_T --title "Life expectancy at birth" --top 15
+# Only the top N entities are drawn in each frame, so tables with hundreds of entities render as fast as small ones.
+
+def nice_axes(ax):
+    ax.set_facecolor('.9')
+    ax.tick_params(labelsize=6, length=0)
+    ax.grid(True, axis='x', color='white')
+    ax.set_axisbelow(True)
+    [spine.set_visible(False) for spine in ax.spines.values()]
+
+def create_race_figure(title, value_label, top_n):
+    """Create the figure and the bars and texts that are reused for every frame"""
+    fig = Figure(figsize=(8, 4.5), dpi=144)
+    FigureCanvasAgg(fig)  # Rasterise with the Agg backend
+    fig.subplots_adjust(left=0.25)
+    ax = fig.add_subplot()
+    nice_axes(ax)
+    ax.set_title(title, fontsize=10)
+    ax.set_xlabel(value_label, fontsize=6)
+    ax.get_xaxis().set_major_formatter(matplotlib.ticker.FuncFormatter(lambda x, p: format(x, ',g')))
+
+    # One bar more than shown, for the entity sliding in from below; the top bar sits at position top_n
+    bars = ax.barh(y=np.arange(top_n + 1), width=np.zeros(top_n + 1))
+    ax.set_ylim(0.5, top_n + 0.5)
+
+    return fig, {
+        'ax': ax,
+        'bars': bars,
+        'value_texts': [ax.text(0, 0, '', va='center', fontsize=6, clip_on=True) for _ in bars],
+        'period_text': ax.text(0.95, 0.08, '', transform=ax.transAxes, horizontalalignment='right',
+                               verticalalignment='bottom', color='black', fontsize=12)
+    }
+
+def draw_race_frame(artists, frame, entities, colors, top_n, value_format):
+    """Move the reused bars to the top N entities of the frame"""
+    period, values, ranks = frame
+    ax = artists['ax']
+
+    visible = visible_entities(ranks, top_n)
+    # Position from the bottom of the chart, so that the highest rank is at top_n
+    positions = ranks[visible] - (len(entities) - top_n)
+
+    for bar, text, k, y_pos in zip(artists['bars'], artists['value_texts'], visible, positions):
+        bar.set_y(y_pos - bar.get_height() / 2)
+        bar.set_width(values[k])
+        bar.set_color(colors[k])
+        text.set_position((values[k], y_pos))
+        text.set_text(' ' + value_format.format(values[k]))
+
+    ax.set_yticks(positions, [entities[k] for k in visible])
+    ax.set_ylim(0.5, top_n + 0.5)  # set_yticks() expands the limits to show the bar below the top N
+    ax.set_xlim(0, max(values[visible].max(), 1e-9) * 1.15)
+    artists['period_text'].set_text(str(period))
+
+def iter_race_images(periods, entities, values, title='', value_label='', top_n=10, steps=5, easing='ease_in_out',
+                     value_format='{:,.1f}'):
+    """Render the race frame by frame and yield each frame as a PNG image"""
+    top_n = min(top_n, len(entities))
+    fig, artists = create_race_figure(title, value_label, top_n)
+    palette = matplotlib.colormaps['tab20'].colors
+    colors = [palette[k % len(palette)] for k in range(len(entities))]
+
+    for frame in iter_frames(values, periods, steps, easing, top_n=top_n):
+        draw_race_frame(artists, frame, entities, colors, top_n, value_format)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png')
+        yield buffer.getvalue()
+
+def render_race(table, entity, time, value, output_format='frames', basename='race', title='', value_label='',
+                top_n=10, steps=5, easing='ease_in_out', interval=150, value_format='{:,.1f}'):
+    """Render a bar chart race from a long (entity, time, value) table and return the output file name"""
+    periods, entities, values = table_to_matrix(table, entity, time, value)
+    images = iter_race_images(periods, entities, values, title, value_label, top_n, steps, easing, value_format)
+    return save_output(images, output_format, basename, title, interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a bar chart race from an (entity, time, value) table')
+    parser.add_argument('table', help='Excel or CSV file with one row per entity and time period')
+    parser.add_argument('--entity', default='Reference area')
+    parser.add_argument('--time', default='TIME_PERIOD')
+    parser.add_argument('--value', default='OBS_VALUE')
+    parser.add_argument('--where', action='append', default=[], metavar='COLUMN=VALUE',
+                        help='Only use rows where COLUMN equals VALUE (can be repeated)')
+    parser.add_argument('--top', type=int, default=10, help='Number of bars shown in each frame')
+    parser.add_argument('--steps', type=int, default=5, help='Frames between two time periods')
+    parser.add_argument('--easing', default='ease_in_out', choices=['linear', 'ease_in_out', 'ease_out'])
+    parser.add_argument('--interval', type=int, default=150, help='Time between frames (in milliseconds)')
+    parser.add_argument('--title', default='')
+    parser.add_argument('--value-label', default='')
+    parser.add_argument('--format', default='frames', choices=['frames', 'mp4', 'webp', 'html'])
+    parser.add_argument('--output', default='race', help='Output file name without extension')
+    args = parser.parse_args()
+
+    table = pd.read_csv(args.table) if args.table.endswith('.csv') else pd.read_excel(args.table)
+    for condition in args.where:
+        column, _, wanted = condition.partition('=')
+        table = table[table[column].astype(str) == wanted]
+
+    filename = render_race(table, args.entity, args.time, args.value, args.format, args.output, args.title,
+                           args.value_label, args.top, args.steps, args.easing, args.interval)
+    print(f'Written {filename}')
\ No newline at end of file
@@ -0,0 +1,64 @@
+import numpy as np
+
+# Easing functions applied to the progress (0 to 1) between two consecutive periods
+EASINGS = {
+    'linear': lambda t: t,
+    'ease_in_out': lambda t: t * t * (3 - 2 * t),
+    'ease_out': lambda t: 1 - (1 - t) ** 2,
+}
+
+def rank_rows(values):
+    """Rank the entities in each row (1 = smallest), ties in column order as in DataFrame.rank(method='first')"""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, axis=1, kind='stable')
+    ranks = np.empty(values.shape, dtype=float)
+    np.put_along_axis(ranks, order, np.arange(1, values.shape[1] + 1, dtype=float)[np.newaxis, :], axis=1)
+    return ranks
+
+def frame_count(periods, steps=5):
+    """Number of frames for the given periods and interpolation steps per period"""
+    return (len(periods) - 1) * steps + 1
+
+def interpolate_frame(values, ranks, periods, i, steps=5, easing='linear'):
+    """Return (period, values, ranks) of frame i, interpolated between the two surrounding periods"""
+    k, step = divmod(i, steps)
+
+    # The last period has no following period to move towards
+    if k >= len(periods) - 1:
+        return periods[-1], values[-1], ranks[-1]
+
+    t = EASINGS[easing](step / steps)
+    frame_values = values[k] + t * (values[k + 1] - values[k])
+    frame_ranks = ranks[k] + t * (ranks[k + 1] - ranks[k])
+    return periods[k], frame_values, frame_ranks
+
+def iter_frames(values, periods, steps=5, easing='linear', start=0, stop=None, top_n=None):
+    """Generate (period, values, ranks) frames lazily, for any number of steps between periods
+
+    values is a (period x entity) array; only one frame is held in memory at a time.
+    With top_n, ranks below the top N are clipped to just under it, so entities that stay
+    outside the top N never sweep through the visible bars.
+    """
+    values = np.asarray(values, dtype=float)
+    ranks = rank_rows(values)
+    if top_n is not None:
+        ranks = np.maximum(ranks, values.shape[1] - top_n)
+    if stop is None:
+        stop = frame_count(periods, steps)
+
+    for i in range(start, stop):
+        yield interpolate_frame(values, ranks, periods, i, steps, easing)
+
+def table_to_matrix(table, entity, time, value):
+    """Pivot a long (entity, time, value) table into periods, entities and a (period x entity) array
+
+    Gaps are filled with the last known value, and entities without any value yet count as zero.
+    """
+    wide = table.pivot_table(index=time, columns=entity, values=value, aggfunc='first').sort_index()
+    wide = wide.ffill().fillna(0)
+    return wide.index.to_numpy(), wide.columns.tolist(), wide.to_numpy(dtype=float)
+
+def visible_entities(ranks, top_n):
+    """Indices of the top_n entities in a frame (plus the next one sliding in), highest rank first"""
+    order = np.argsort(-ranks, kind='stable')
+    return order[:top_n + 1]
\ No newline at end of file
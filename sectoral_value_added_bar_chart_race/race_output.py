@@ -0,0 +1,109 @@
+import base64
+import io
+import json
+import os
+import subprocess
+from string import Template
+from PIL import Image
+
+# A minimal JavaScript player for the rendered frames
+PLAYER_TEMPLATE = Template('''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<title>$title</title>
+</head>
+<body style="text-align: center; font-family: Arial, Helvetica, sans-serif;">
+<img id="frame" src="" style="max-width: 100%;">
+<div>
+  <button id="play">Play</button>
+  <input id="slider" type="range" min="0" max="$last_frame" value="0" style="width: 60%;">
+</div>
+<script>
+var frames = $frames;
+var img = document.getElementById('frame');
+var slider = document.getElementById('slider');
+var button = document.getElementById('play');
+var timer = null;
+function show(i) {
+  img.src = frames[i];
+  slider.value = i;
+  // Fetch the next few frames ahead of playback
+  for (var j = i + 1; j < Math.min(i + 6, frames.length); j++) { new Image().src = frames[j]; }
+}
+function stop() { clearInterval(timer); timer = null; button.textContent = 'Play'; }
+button.onclick = function () {
+  if (timer) { stop(); return; }
+  if (+slider.value >= frames.length - 1) { show(0); }
+  button.textContent = 'Pause';
+  timer = setInterval(function () {
+    var next = +slider.value + 1;
+    if (next >= frames.length) { stop(); } else { show(next); }
+  }, $interval);
+};
+slider.oninput = function () { stop(); show(+slider.value); };
+show(0);
+</script>
+</body>
+</html>
+''')
+
+def save_html(images, filename, title, interval):
+    """Write the frames into an HTML page with a JavaScript player"""
+    frames = ['data:image/png;base64,' + base64.b64encode(image).decode('ascii') for image in images]
+    with open(filename, 'w') as f:
+        f.write(PLAYER_TEMPLATE.substitute(title=title, frames=json.dumps(frames),
+                                           last_frame=len(frames) - 1, interval=interval))
+
+def save_frames(images, filename, title, interval, frames_dir):
+    """Write each frame as a WebP file and a small HTML player that loads them lazily"""
+    os.makedirs(os.path.join(os.path.dirname(filename), frames_dir), exist_ok=True)
+    frames = []
+    # Frames are written as they arrive, so a generator of images is never held in memory
+    for n, image in enumerate(images):
+        frame_path = f'{frames_dir}/frame_{n:04d}.webp'
+        Image.open(io.BytesIO(image)).save(os.path.join(os.path.dirname(filename), frame_path), quality=80)
+        frames.append(frame_path)
+    with open(filename, 'w') as f:
+        f.write(PLAYER_TEMPLATE.substitute(title=title, frames=json.dumps(frames),
+                                           last_frame=len(frames) - 1, interval=interval))
+
+def save_mp4(images, filename, interval):
+    """Encode the frames into an H.264 video with a local ffmpeg"""
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'image2pipe', '-c:v', 'png',
+               '-framerate', str(1000 / interval), '-i', '-',
+               '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', filename]
+    # Frames are piped to ffmpeg as they arrive
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        for image in images:
+            process.stdin.write(image)
+        process.stdin.close()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+def save_webp(images, filename, interval):
+    """Write the frames into an animated WebP image"""
+    images = iter(images)
+    first = next(images, None)
+    if first is None:
+        raise ValueError(f'No frames to write to {filename}')
+    # The other frames are opened lazily: each one keeps only its PNG bytes until the encoder decodes it
+    frames = (Image.open(io.BytesIO(image)) for image in images)
+    Image.open(io.BytesIO(first)).save(filename, save_all=True, append_images=frames, duration=interval, loop=0,
+                                       quality=80)
+
+def save_output(images, output_format, basename, title, interval, frames_dir=None):
+    """Write PNG frames (a list or a generator) in the given output format and return the file name"""
+    if output_format == 'mp4':
+        filename = f'{basename}.mp4'
+        save_mp4(images, filename, interval)
+    elif output_format == 'webp':
+        filename = f'{basename}.webp'
+        save_webp(images, filename, interval)
+    elif output_format == 'html':
+        filename = f'{basename}.html'
+        save_html(images, filename, title, interval)
+    else:
+        filename = f'{basename}.html'
+        save_frames(images, filename, title, interval, frames_dir or f'{os.path.basename(basename)}_frames')
+    return filename
\ No newline at end of file
@@ -0,0 +1,33 @@
+import pandas as pd
+
+# Sector names shown in the charts, in the column order of load_sector_table()
+labels=['Agriculture, fishing, mining & quarrying',
+        'Manufacturing',
+        'Electricity, gas & water supply',
+        'Construction',        
+        'Retail trade',
+        'Accommodation services',
+        'Food & beverage services',
+        'Land transport',
+        'Water transport',
+        'Air transport',
+        'Financing',
+        'Insurance',
+        'Real estate',
+        'Telecommunications',
+        'Other information & communications services',
+        'Professional & business services',
+        'Public administration',
+        'Social & personal services',
+        'Ownership of premises',
+        'Wholesale, import & export trade',
+        'Warehousing, courier & other transport services']
+
+def load_sector_table(path="Table 310-34101.xlsx"):
+    """Read the value added table, with one row per year and one column per sector"""
+    df_raw=pd.read_excel(path)
+    df_raw['Wholesale, import & export trade']=df_raw['Wholesale']+df_raw['Import and export trade']
+    df_raw['Warehousing, courier and other transportation services']=df_raw['Warehousing and other transportation services']+df_raw['Postal and courier services']
+    df_raw.drop(columns=['Wholesale', 'Import and export trade', 'Warehousing and other transportation services', 'Postal and courier services'],inplace=True)
+    df_raw.set_index('Year',inplace=True)
+    return df_raw
\ No newline at end of file
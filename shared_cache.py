@@ -0,0 +1,144 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from lazy_imports import lazy_import
+
+# Imported on first use (see lazy_imports.py)
+pd = lazy_import('pandas')
+plotly_json = lazy_import('plotly.io.json')
+
+# Cache shared by all instances of the app behind the load balancer, behind the cache of each instance
+# (local_cache.py), e.g.
+#   SHARED_CACHE_URL=redis://cache-host:6379/0 gunicorn --config gunicorn.conf.py app:server
+# Any server speaking the Redis protocol will do (Redis, Valkey, KeyDB...), through the redis package.
+# SHARED_CACHE_URL=memory uses an in-process stand-in with the same GET/SET behaviour instead, for running and
+# testing without a server. Without SHARED_CACHE_URL only the cache of the instance is used.
+# The keys hold the content hash of the data (see datastore.source_version), so all instances share the entries.
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL', '')
+
+# Size limit of the in-process stand-in (in bytes of cached data), like a Redis server with maxmemory-policy allkeys-lru
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+
+# Prefix of all keys, so the cache server can be shared with other apps
+KEY_PREFIX = 'well-being:'
+
+# Hit and miss counts of the shared tier in this process (local_cache.py counts those of its tiers)
+stats = {
+    'shared': {'hits': 0, 'misses': 0}
+}
+
+# Redis client, created on first use
+_client = {'client': None}
+
+# Entries of the in-process stand-in: key -> (expiry time, value), least recently used first
+_memory_store = OrderedDict()
+_memory_size = {'bytes': 0}
+_memory_lock = threading.Lock()
+
+def make_key(name, version, *args):
+    """Key of a cached value: the version (content hash) of the data is part of the key, so a new version never reads
+    old entries and every instance with the same data reads the same entries"""
+    digest = hashlib.sha1(json.dumps(args, default=str).encode('utf-8')).hexdigest()[:16]
+    return f'{KEY_PREFIX}{name}:{version}:{digest}'
+
+def client():
+    """Redis client of SHARED_CACHE_URL"""
+    if _client['client'] is None:
+        import redis
+        # Short timeouts, so an unreachable cache server only costs a cache miss
+        _client['client'] = redis.Redis.from_url(SHARED_CACHE_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _client['client']
+
+def shared_get(key):
+    """Value of a key in the shared tier, or None"""
+    if not SHARED_CACHE_URL:
+        return None
+    if SHARED_CACHE_URL == 'memory':
+        with _memory_lock:
+            expires, value = _memory_store.get(key, (0, None))
+            if value is None or expires <= time.time():
+                memory_delete(key)
+                return None
+            _memory_store.move_to_end(key)
+            return value
+
+    import redis
+    try:
+        return client().get(key)
+    except redis.RedisError:
+        return None
+
+def shared_set(key, value, timeout):
+    """Store a value in the shared tier, expiring after timeout seconds"""
+    if not SHARED_CACHE_URL:
+        return
+    if SHARED_CACHE_URL == 'memory':
+        # Values larger than the whole stand-in are not stored
+        if len(value) > MEMORY_MAX_BYTES:
+            return
+        with _memory_lock:
+            memory_delete(key)
+            _memory_store[key] = (time.time() + timeout, value)
+            _memory_size['bytes'] += len(value)
+            while _memory_size['bytes'] > MEMORY_MAX_BYTES:
+                memory_delete(next(iter(_memory_store)))
+        return
+
+    import redis
+    try:
+        client().set(key, value, ex=timeout)
+    except redis.RedisError:
+        pass
+
+def memory_delete(key):
+    """Remove a key from the in-process stand-in (the caller holds _memory_lock)"""
+    entry = _memory_store.pop(key, None)
+    if entry is not None:
+        _memory_size['bytes'] -= len(entry[1])
+
+def cached(key, compute, encode, decode, timeout, local=None):
+    """Return the cached value of a key, computing and storing it in both tiers on a miss
+
+    The value is stored as the bytes returned by encode (never pickled objects), in the local cache of this
+    instance (local_cache) first and then in the shared tier.
+    """
+    if local is not None:
+        data = local.get(key)
+        if data is not None:
+            return decode(data)
+
+    data = shared_get(key)
+    if data is not None:
+        stats['shared']['hits'] += 1
+        if local is not None:
+            local.set(key, data, timeout=timeout)
+        return decode(data)
+    stats['shared']['misses'] += 1
+
+    value = compute()
+    data = encode(value)
+    if local is not None:
+        local.set(key, data, timeout=timeout)
+    shared_set(key, data, timeout)
+    return value
+
+def encode_frame(df):
+    """DataFrame as compressed Parquet"""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False, compression='zstd')
+    return buffer.getvalue()
+
+def decode_frame(data):
+    return pd.read_parquet(io.BytesIO(data))
+
+def encode_json(value):
+    """Dash components and figures as compressed JSON (decoded as the dicts Dash sends to the browser)"""
+    return zlib.compress(plotly_json.to_json_plotly(value).encode('utf-8'))
+
+def decode_json(data):
+    return json.loads(zlib.decompress(data))
@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from lazy_imports import lazy_import
+import datastore
+
+# Imported on first use (see lazy_imports.py)
+pd = lazy_import('pandas')
+
+# Indexed SQLite copy of the data store sources, for callbacks that only need a few rows at a time, e.g.
+#   sql_store.select_rows('well_being', {'Reference area': 'Hong Kong', 'Domain': 'Health'})
+# The conditions become the WHERE clause of an indexed query, so only the matching rows are read into memory.
+
+SQLITE_FILE = os.path.join(datastore.STORE_DIR, 'store.sqlite')
+
+# Held while a process copies a source into SQLite, so concurrent workers never write the same table
+LOCK_FILE = SQLITE_FILE + '.lock'
+
+# Indexes of each source, on the columns the dashboard callbacks filter on together
+INDEXES = {
+    'well_being': [
+        ['Reference area', 'Domain'],
+        ['Domain', 'AGE', 'EDUCATION_LEV', 'SEX'],
+        ['MEASURE', 'AGE', 'SEX', 'EDUCATION_LEV', 'TIME_PERIOD']
+    ]
+}
+
+def quote(name):
+    """Quote a table or column name for SQLite"""
+    return '"' + name.replace('"', '""') + '"'
+
+def connect():
+    os.makedirs(datastore.STORE_DIR, exist_ok=True)
+    return closing(sqlite3.connect(SQLITE_FILE, timeout=60))
+
+def ensure_table(name):
+    """Copy a source from the data store into SQLite if it is missing or its files have changed
+
+    Returns the column names of the source. SQLite compares column names case-insensitively
+    (e.g. DOMAIN and Domain), so the columns are stored by position as c0, c1, ...
+    """
+    version = datastore.source_version(name)
+
+    with connect() as conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS versions (source TEXT PRIMARY KEY, version TEXT, columns TEXT)')
+        row = conn.execute('SELECT version, columns FROM versions WHERE source = ?', (name,)).fetchone()
+    if row is not None and row[0] == version:
+        return json.loads(row[1])
+
+    with datastore.file_lock(LOCK_FILE), connect() as conn:
+        # Checked again, as another process may have copied it while this one waited for the lock
+        row = conn.execute('SELECT version, columns FROM versions WHERE source = ?', (name,)).fetchone()
+        if row is not None and row[0] == version:
+            return json.loads(row[1])
+
+        # Write the new copy next to the old one and swap them in one transaction
+        df = datastore.query(name)
+        columns = df.columns.tolist()
+        new_table = name + '_new'
+        df.set_axis([f'c{k}' for k in range(len(columns))], axis=1).to_sql(new_table, conn, if_exists='replace',
+                                                                           index=False)
+        with conn:
+            conn.execute(f'DROP TABLE IF EXISTS {quote(name)}')
+            conn.execute(f'ALTER TABLE {quote(new_table)} RENAME TO {quote(name)}')
+            for k, indexed in enumerate(INDEXES.get(name, [])):
+                conn.execute(f'CREATE INDEX {quote(f"{name}_{k}")} ON {quote(name)} '
+                             f'({", ".join(f"c{columns.index(column)}" for column in indexed)})')
+            conn.execute('INSERT OR REPLACE INTO versions (source, version, columns) VALUES (?, ?, ?)',
+                         (name, version, json.dumps(columns)))
+
+    return columns
+
+def where_clause(stored, conditions):
+    """WHERE clause (empty without conditions) and parameters of the conditions (see select_rows), with stored the
+    name of each column in SQLite"""
+    clauses, params = [], []
+    for column, value in conditions.items():
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            clauses.append(f'{stored[column]} IN ({", ".join("?" * len(value))})')
+            params += value
+        else:
+            clauses.append(f'{stored[column]} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+def build_query(name, conditions, columns=None):
+    """SQL, parameters and column names of the rows of a source matching the conditions (see select_rows)"""
+    source_columns = ensure_table(name)
+    stored = {column: f'c{k}' for k, column in enumerate(source_columns)}
+    where, params = where_clause(stored, conditions)
+
+    if columns is None:
+        columns = source_columns
+    sql = f'SELECT {", ".join(stored[column] for column in columns)} FROM {quote(name)}{where} ORDER BY rowid'
+    return sql, params, list(columns)
+
+def select_rows(name, conditions, columns=None):
+    """Rows of a source where each column equals the given value, or one of the given values (list)
+
+    The rows come back in the order of the source files.
+    """
+    sql, params, columns = build_query(name, conditions, columns)
+    with connect() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    return df.set_axis(columns, axis=1)
+
+def distinct_rows(name, columns, key=None, conditions=None):
+    """Distinct rows of the columns of a source, in the order of the source files
+
+    With key (a list of columns), the first row of each distinct key, like DataFrame.drop_duplicates(key).
+    Only the distinct rows are read into memory.
+    """
+    source_columns = ensure_table(name)
+    stored = {column: f'c{k}' for k, column in enumerate(source_columns)}
+    where, params = where_clause(stored, conditions or {})
+
+    group = ', '.join(stored[column] for column in (key or columns))
+    sql = (f'SELECT {", ".join(stored[column] for column in columns)} FROM {quote(name)} '
+           f'WHERE rowid IN (SELECT MIN(rowid) FROM {quote(name)}{where} GROUP BY {group}) ORDER BY rowid')
+    with connect() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    return df.set_axis(list(columns), axis=1)
+
+def column_types(name):
+    """SQLite type of each column of a source (TEXT, REAL, INTEGER...), by column name"""
+    source_columns = ensure_table(name)
+    with connect() as conn:
+        types = {column: column_type for _, column, column_type, *_ in
+                 conn.execute(f'PRAGMA table_info({quote(name)})')}
+    return {column: types[f'c{k}'] for k, column in enumerate(source_columns)}
+
+def iter_rows(name, conditions, columns=None, chunk_size=5000):
+    """Yield the rows of select_rows as lists of tuples of at most chunk_size rows, reading one chunk at a time"""
+    sql, params, columns = build_query(name, conditions, columns)
+    with connect() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
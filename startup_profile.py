@@ -0,0 +1,60 @@
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+# Report how long the app takes to start, per imported module, e.g.
+#   python startup_profile.py
+#   python startup_profile.py --module sector_race_page --top 30
+# The module is imported in a fresh interpreter with Python's -X importtime, so nothing is imported beforehand.
+
+WARM_UP_CODE = '''
+import time
+import app
+start = time.perf_counter()
+app.warm_up()
+print(time.perf_counter() - start)
+'''
+
+def import_times(module):
+    """Return {module: (self, cumulative)} import times in seconds, in the order the imports finished"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       self |  cumulative | [indent]module"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return times
+
+def package_times(times):
+    """Total import time of each top-level package (the sum of the self times of its modules)"""
+    totals = defaultdict(float)
+    for name, (self_time, _) in times.items():
+        totals[name.split('.')[0]] += self_time
+    return totals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the import time of the app per module')
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages and modules listed')
+    parser.add_argument('--warm-up', action='store_true', help='Also time app.warm_up() (loading the data)')
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    print(f'Importing {args.module} took {times[args.module][1]:.3f} s\n')
+
+    print('Slowest packages (time spent in their own modules):')
+    for name, total in sorted(package_times(times).items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {total:8.3f} s  {name}')
+
+    print('\nSlowest modules (including the modules they import):')
+    for name, (_, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f'  {cumulative:8.3f} s  {name}')
+
+    if args.warm_up:
+        result = subprocess.run([sys.executable, '-c', WARM_UP_CODE], capture_output=True, text=True, check=True)
+        print(f'\napp.warm_up() took {float(result.stdout.split()[-1]):.3f} s')